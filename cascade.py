@@ -0,0 +1,163 @@
+import math
+import time
+from collections import defaultdict
+from index_builder import parse_useful_votes
+from ranker import accumulate_bm25_scores, rank_scores, build_corpus_stats
+
+DEFAULT_CASCADE_CONFIG = {
+    "num_candidates": 100,   # 第一阶段保留的候选评论数量
+    "stage1_budget_ms": None,   # 第一阶段时间预算（毫秒），None表示不限
+    "stage2_budget_ms": None,   # 第二阶段时间预算（毫秒），None表示不限
+    "weights": {"first_stage": 1.0, "phrase": 0.3, "proximity": 0.5, "stars": 0.1, "votes": 0.1}   # 第二阶段各特征的权重
+}
+
+
+def build_rerank_features(review_df):
+    """
+    重排特征建立函数，预先计算第一阶段需要的评论长度统计和第二阶段需要的词项序列、评论评分和useful票数
+    :param review_df: 预处理后的评论数据
+    :return: 重排特征，字典结构，{"doc_lengths": {review_id: token数}, "doc_count": 评论数, "avgdl": 平均长度,
+             "texts": {review_id: processed_text}, "stars": {review_id: 评论评分}, "useful": {review_id: useful票数}}
+    """
+    review_ids = list(review_df['review_id'].astype(str).str.strip())
+    texts = dict(zip(review_ids, review_df['processed_text'].fillna('')))
+    return {
+        **build_corpus_stats(review_df),
+        "texts": texts,
+        "stars": dict(zip(review_ids, review_df['stars'])) if 'stars' in review_df else {},
+        "useful": dict(zip(review_ids, review_df['votes'].apply(parse_useful_votes))) if 'votes' in review_df else {}
+    }
+
+
+def proximity_score(tokens, terms):
+    """
+    词项邻近度计算函数，求覆盖评论中出现的全部不同查询词项的最短窗口
+    :param tokens: 评论的词项列表
+    :param terms: 查询词项列表
+    :return: 邻近度，为命中的不同词项数/最短窗口长度与命中比例的乘积，取值范围[0, 1]
+    """
+    query_set = set(terms)
+    if len(query_set) < 2:
+        return 0.0
+    positions = [(i, token) for i, token in enumerate(tokens) if token in query_set]
+    matched = len({token for _, token in positions})
+    if matched < 2:
+        return 0.0
+
+    counts = defaultdict(int)
+    covered, left, best_span = 0, 0, len(tokens)
+    for right in range(len(positions)):
+        token = positions[right][1]
+        counts[token] += 1
+        if counts[token] == 1:
+            covered += 1
+        while covered == matched:
+            best_span = min(best_span, positions[right][0] - positions[left][0] + 1)
+            left_token = positions[left][1]
+            counts[left_token] -= 1
+            if counts[left_token] == 0:
+                covered -= 1
+            left += 1
+    return (matched / best_span) * (matched / len(query_set))
+
+
+def first_stage(terms, unigram_index, features, valid_ids=None, num_candidates=100, budget_ms=None):
+    """
+    第一阶段：使用预先计算的统计信息进行BM25打分，按idf从高到低逐个处理词项，超出时间预算时跳过剩余（区分度较低的）词项
+    :param terms: 查询词项列表
+    :param unigram_index: 单词索引
+    :param features: 重排特征，见build_rerank_features
+    :param valid_ids: 有效评论ID集合，默认为None，表示不过滤
+    :param num_candidates: 保留的候选评论数量，默认为100
+    :param budget_ms: 时间预算（毫秒），默认为None，表示不限
+    :return: candidates：得分最高的num_candidates个(review_id, score)列表；stats：统计信息
+    """
+    start = time.perf_counter()
+    doc_count = features["doc_count"]
+    doc_freqs = {term: len(unigram_index[term]) for term in set(terms) if term in unigram_index}
+    ordered_terms = sorted(doc_freqs, key=lambda t: doc_freqs[t])   # 文档频率越低，idf越高
+
+    scores = defaultdict(float)
+    processed = 0
+    for term in ordered_terms:
+        if budget_ms is not None and processed > 0 and (time.perf_counter() - start) * 1000 > budget_ms:
+            break
+        term_scores = accumulate_bm25_scores([term] * terms.count(term), unigram_index, features["doc_lengths"], doc_count,
+                                             features["avgdl"], doc_freqs, valid_ids=valid_ids)
+        for rid, score in term_scores.items():
+            scores[rid] += score
+        processed += 1
+
+    candidates = rank_scores(scores, top_n=num_candidates)
+    stats = {
+        "stage1_ms": (time.perf_counter() - start) * 1000,
+        "stage1_terms": f"{processed}/{len(ordered_terms)}",
+        "stage1_scored_docs": len(scores),
+        "stage1_candidates": len(candidates)
+    }
+    return candidates, stats
+
+
+def second_stage(candidates, terms, phrases, bigram_index, features, weights=None, budget_ms=None):
+    """
+    第二阶段：只对候选评论计算短语命中、词项邻近度、评论评分和useful票数等特征并重新打分。
+    超出时间预算时停止重排，剩余候选按第一阶段的顺序排在全部已重排的候选之后（只使用名次，不与重排得分混用）
+    :param candidates: 第一阶段得到的(review_id, score)列表，按得分从高到低排列
+    :param terms: 查询词项列表
+    :param phrases: 短语列表
+    :param bigram_index: 双词索引
+    :param features: 重排特征，见build_rerank_features
+    :param weights: 各特征的权重，默认为None，表示使用DEFAULT_CASCADE_CONFIG中的权重
+    :param budget_ms: 时间预算（毫秒），默认为None，表示不限
+    :return: doc_scores：候选评论的最终得分，字典结构，{review_id: score}；stats：统计信息
+    """
+    start = time.perf_counter()
+    weights = {**DEFAULT_CASCADE_CONFIG["weights"], **(weights or {})}
+    max_score = max((abs(score) for _, score in candidates), default=0) or 1.0   # 第一阶段得分归一化
+
+    doc_scores = {}
+    for rid, score in candidates:
+        if budget_ms is not None and (time.perf_counter() - start) * 1000 > budget_ms:
+            break
+        first = weights["first_stage"] * score / max_score
+        phrase_hits = sum(bigram_index[phrase].get(rid, 0) for phrase in phrases if phrase in bigram_index)
+        proximity = proximity_score(features["texts"].get(rid, '').split(), terms)
+        stars = features["stars"].get(rid)
+        stars = (stars - 3) / 2 if stars is not None and not math.isnan(stars) else 0.0   # 映射到[-1, 1]
+        votes = min(1.0, math.log1p(features["useful"].get(rid, 0)) / math.log1p(50))
+        doc_scores[rid] = (first + weights["phrase"] * math.log1p(phrase_hits) + weights["proximity"] * proximity
+                           + weights["stars"] * stars + weights["votes"] * votes)
+    rescored = len(doc_scores)
+
+    # 未重排的候选按第一阶段名次依次排在最低的重排得分之下
+    floor = min(doc_scores.values(), default=0.0)
+    for rank, (rid, _) in enumerate(candidates[rescored:], start=1):
+        doc_scores[rid] = floor - rank
+
+    stats = {
+        "stage2_ms": (time.perf_counter() - start) * 1000,
+        "stage2_rescored": f"{rescored}/{len(candidates)}"
+    }
+    return doc_scores, stats
+
+
+def run_cascade(terms, phrases, unigram_index, bigram_index, features, valid_ids=None, config=None, top_n=None):
+    """
+    两阶段检索入口，第一阶段用BM25快速生成候选，第二阶段只对候选使用更丰富的特征重新打分
+    :param terms: 查询词项列表
+    :param phrases: 短语列表
+    :param unigram_index: 单词索引
+    :param bigram_index: 双词索引
+    :param features: 重排特征，见build_rerank_features
+    :param valid_ids: 有效评论ID集合，默认为None，表示不过滤
+    :param config: 配置，字典结构，见DEFAULT_CASCADE_CONFIG，未指定的项使用默认值
+    :param top_n: 最终需要返回的结果数量，默认为None；候选数量少于top_n时按top_n保留候选，避免结果被截断
+    :return: doc_scores：候选评论的最终得分，字典结构，{review_id: score}；stats：两个阶段的耗时等统计信息
+    """
+    config = {**DEFAULT_CASCADE_CONFIG, **(config or {})}
+    num_candidates = max(config["num_candidates"], top_n or 0)
+    candidates, stage1_stats = first_stage(terms, unigram_index, features, valid_ids=valid_ids,
+                                           num_candidates=num_candidates, budget_ms=config["stage1_budget_ms"])
+    doc_scores, stage2_stats = second_stage(candidates, terms, phrases, bigram_index, features, weights=config["weights"],
+                                            budget_ms=config["stage2_budget_ms"])
+    return doc_scores, {**stage1_stats, **stage2_stats}
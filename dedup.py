@@ -0,0 +1,198 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+import json
+import os
+import random
+import zlib
+import numpy as np
+
+HASH_PRIME = 4294967291   # 小于2^32的最大素数，保证a * h + b不会超出uint64范围
+
+
+def make_permutations(num_perm=64, seed=1):
+    """
+    MinHash哈希函数参数生成函数，每个哈希函数形如(a * h + b) mod p
+    :param num_perm: 哈希函数数量（签名长度），默认为64
+    :param seed: 随机种子，默认为1，保证不同进程生成相同的参数
+    :return: (a, b)，均为长度为num_perm的uint64数组
+    """
+    rng = random.Random(seed)
+    a = np.array([rng.randint(1, HASH_PRIME - 1) for _ in range(num_perm)], dtype=np.uint64)
+    b = np.array([rng.randint(0, HASH_PRIME - 1) for _ in range(num_perm)], dtype=np.uint64)
+    return a, b
+
+
+def shingle_hashes(tokens, shingle_size=3):
+    """
+    词项shingle哈希函数，将连续shingle_size个词项作为一个shingle并计算crc32
+    :param tokens: 预处理后的词项列表
+    :param shingle_size: shingle长度，默认为3
+    :return: shingle哈希值数组（uint64），评论过短时整条评论作为一个shingle
+    """
+    if len(tokens) <= shingle_size:
+        shingles = {" ".join(tokens)} if tokens else set()
+    else:
+        shingles = {" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash_signature(tokens, permutations, shingle_size=3):
+    """
+    MinHash签名计算函数
+    :param tokens: 预处理后的词项列表
+    :param permutations: 哈希函数参数，见make_permutations
+    :param shingle_size: shingle长度，默认为3
+    :return: MinHash签名（uint64数组），评论为空时返回None
+    """
+    hashes = shingle_hashes(tokens, shingle_size)
+    if len(hashes) == 0:
+        return None
+    a, b = permutations
+    return ((np.outer(a, hashes) + b[:, None]) % HASH_PRIME).min(axis=1)
+
+
+def _signature_chunk(review_ids, texts, num_perm, shingle_size, seed):
+    """
+    计算一组评论的MinHash签名，作为多进程任务的执行单元
+    :return: (review_id, 签名)列表，空评论不返回
+    """
+    permutations = make_permutations(num_perm, seed)
+    result = []
+    for review_id, text in zip(review_ids, texts):
+        signature = minhash_signature(text.split(), permutations, shingle_size)
+        if signature is not None:
+            result.append((review_id, signature))
+    return result
+
+
+def compute_signatures(review_df, num_perm=64, shingle_size=3, max_workers=None, chunk_size=5000, seed=1):
+    """
+    MinHash签名计算入口，按评论分块，可多进程并行计算
+    :param review_df: 预处理后的评论数据
+    :param num_perm: 签名长度，默认为64
+    :param shingle_size: shingle长度，默认为3
+    :param max_workers: 进程数，默认为None，表示在当前进程中计算
+    :param chunk_size: 每个任务包含的评论数量，默认为5000
+    :param seed: 随机种子，默认为1
+    :return: (review_id, 签名)列表，顺序与review_df一致
+    """
+    review_ids = list(review_df['review_id'])
+    texts = list(review_df['processed_text'].fillna(''))
+    chunks = [(review_ids[i:i + chunk_size], texts[i:i + chunk_size]) for i in range(0, len(review_ids), chunk_size)]
+
+    if max_workers is not None and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_signature_chunk, ids, chunk_texts, num_perm, shingle_size, seed)
+                       for ids, chunk_texts in chunks]
+            parts = [future.result() for future in futures]
+    else:
+        parts = [_signature_chunk(ids, chunk_texts, num_perm, shingle_size, seed) for ids, chunk_texts in chunks]
+    return [item for part in parts for item in part]
+
+
+def find_duplicate_clusters(signatures, bands=16, threshold=0.8):
+    """
+    LSH近似重复聚类函数，签名分成bands段，任意一段完全相同的评论成为候选对，估计Jaccard相似度不低于threshold时合并为一个簇
+    :param signatures: (review_id, 签名)列表，见compute_signatures
+    :param bands: LSH分段数量，需整除签名长度，默认为16
+    :param threshold: Jaccard相似度阈值，默认为0.8
+    :return: 簇映射，字典结构，{review_id: 代表评论review_id}，只包含大小超过1的簇，代表评论为簇中最早出现的评论
+    """
+    if not signatures:
+        return {}
+    num_perm = len(signatures[0][1])
+    if num_perm % bands != 0:
+        raise ValueError(f"签名长度{num_perm}不能被分段数量{bands}整除！")
+    rows = num_perm // bands
+
+    # 并查集，根节点始终为下标最小（最早出现）的评论
+    parent = list(range(len(signatures)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, (_, signature) in enumerate(signatures):
+            buckets[signature[band * rows:(band + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            leader = members[0]
+            for i in members[1:]:
+                root_i, root_leader = find(i), find(leader)
+                if root_i == root_leader:
+                    continue
+                # 用签名中相同位置的比例估计Jaccard相似度，过滤LSH的假阳性
+                similarity = np.mean(signatures[i][1] == signatures[leader][1])
+                if similarity >= threshold:
+                    parent[max(root_i, root_leader)] = min(root_i, root_leader)
+
+    cluster_map = {}
+    for i, (review_id, _) in enumerate(signatures):
+        root = find(i)
+        if root != i:
+            cluster_map[review_id] = signatures[root][0]
+            cluster_map[signatures[root][0]] = signatures[root][0]
+    return cluster_map
+
+
+def deduplicate_reviews(review_df, threshold=0.8, num_perm=64, bands=16, shingle_size=3, max_workers=None):
+    """
+    近似重复评论去除入口，只保留每个簇的代表评论，并统计索引规模的减少量
+    :param review_df: 预处理后的评论数据
+    :param threshold: Jaccard相似度阈值，默认为0.8
+    :param num_perm: MinHash签名长度，默认为64
+    :param bands: LSH分段数量，默认为16
+    :param shingle_size: shingle长度，默认为3
+    :param max_workers: 计算签名的进程数，默认为None，表示在当前进程中计算
+    :return: canonical_df：只包含代表评论（及不重复评论）的评论数据；cluster_map：簇映射，见find_duplicate_clusters；
+             report：统计信息，字典结构，{"removed_reviews": 去除的评论数, "removed_unigram_postings": 减少的单词索引倒排项数,
+             "removed_tokens": 减少的词项数}
+    """
+    signatures = compute_signatures(review_df, num_perm=num_perm, shingle_size=shingle_size, max_workers=max_workers)
+    cluster_map = find_duplicate_clusters(signatures, bands=bands, threshold=threshold)
+    duplicate_ids = {rid for rid, canonical in cluster_map.items() if rid != canonical}
+
+    is_duplicate = review_df['review_id'].isin(duplicate_ids)
+    removed_tokens = [text.split() for text in review_df.loc[is_duplicate, 'processed_text'].fillna('')]
+    report = {
+        "removed_reviews": len(removed_tokens),
+        "removed_unigram_postings": sum(len(set(tokens)) for tokens in removed_tokens),
+        "removed_tokens": sum(len(tokens) for tokens in removed_tokens)
+    }
+    print(f"近似重复检测完成：共{len(set(cluster_map.values()))}个重复簇，去除{report['removed_reviews']}条评论，"
+          f"单词索引减少{report['removed_unigram_postings']}个倒排项（{report['removed_tokens']}个词项）")
+    return review_df[~is_duplicate].copy(), cluster_map, report
+
+
+def collapse_duplicate_scores(doc_scores, cluster_map):
+    """
+    查询时的近似重复折叠函数，每个簇只保留得分最高的评论
+    :param doc_scores: 评论得分，字典结构，{review_id: score}
+    :param cluster_map: 簇映射，见find_duplicate_clusters
+    :return: 折叠后的评论得分，字典结构，{review_id: score}
+    """
+    best = {}
+    for rid, score in doc_scores.items():
+        key = cluster_map.get(rid, rid)
+        if key not in best or score > best[key][1]:
+            best[key] = (rid, score)
+    return dict(best.values())
+
+
+def save_cluster_map(cluster_map, save_dir='index_output'):
+    """
+    簇映射保存函数
+    :param cluster_map: 簇映射
+    :param save_dir: 保存路径，默认为./index_output
+    """
+    if save_dir is None:
+        save_dir = 'index_output'
+    os.makedirs(save_dir, exist_ok=True)
+    with open(f"{save_dir}/cluster_map.json", 'w', encoding='utf-8') as f:
+        json.dump(cluster_map, f, ensure_ascii=False)
+    print("近似重复簇映射已保存。")
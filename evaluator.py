@@ -2,6 +2,7 @@ import pandas as pd
 import time
 from faceted_search import filter_businesses
 from query_processor import parse_query, run_query
+from cascade import build_rerank_features
 import os
 import math
 
@@ -87,7 +88,8 @@ def generate_relevance_judgments(queries, review_df, business_df, facets=None, t
     return relevance_judgments
 
 
-def evaluate_query(query, relevant_docs, unigram_index, bigram_index, review_df, business_df, top_k=10, facets=None, method='bm25', process_flag=(True, True, True, True)):
+def evaluate_query(query, relevant_docs, unigram_index, bigram_index, review_df, business_df, top_k=10, facets=None, method='bm25', process_flag=(True, True, True, True),
+                   rerank_features=None):
     """
     单个查询字符串评估函数
     :param query: 查询字符串(String类型)
@@ -98,14 +100,16 @@ def evaluate_query(query, relevant_docs, unigram_index, bigram_index, review_df,
     :param business_df: 企业数据
     :param top_k: 每个查询最多选多少条相关评论
     :param facets: 分面搜索条件，字典结构，{"city": xx, "categories": [yy], "stars": zz}，默认为None
-    :param method: 检索方法，默认为''bm25'，可选值为{'tf', 'tfidf', 'bm25'}
+    :param method: 检索方法，默认为''bm25'，可选值为{'tf', 'tfidf', 'bm25', 'cascade'}
     :param process_flag: 预处理标志，元组结构，为(enable_stemming, ignore_case, process_numbers, remove_punctuation)
                          其中enable_stemming: 是否进行词干提取，默认为True; ignore_case: 是否忽略大小写，默认为True; process_numbers: 是否进行数字处理，True为将整体数字变成单个数字，False为忽略数字，默认为True;
                          remove_punctuation: 是否忽略标点，默认为True
+    :param rerank_features: 预先建立的重排特征，method为'cascade'时用于重排，其余方法使用其中的全局统计信息，默认为None
     :return: 精确率prec，召回率rec，F1分数f1
     """
     # 获取检索到的评论
-    ranked_docs = run_query(query, unigram_index, bigram_index, method, review_df, business_df, facets=facets, top_n=top_k, process_flag=process_flag)
+    ranked_docs = run_query(query, unigram_index, bigram_index, method, review_df, business_df, facets=facets, top_n=top_k, process_flag=process_flag,
+                            rerank_features=rerank_features)
     retrieved = [review_id for review_id, _ in ranked_docs]
     # 评估指标计算
     prec = precision(retrieved, relevant_docs)
@@ -132,14 +136,16 @@ def run_evaluation(sample_queries, unigram_index, bigram_index, review_df, busin
     """
     # 生成伪相关文档
     relevance_judgments = generate_relevance_judgments(sample_queries, review_df, business_df=business_df, facets=facets, top_k=None, process_flag=process_flag)
-    methods = ['tf', 'tfidf', 'bm25']
+    methods = ['tf', 'tfidf', 'bm25', 'cascade']
     results = {m: [] for m in methods}
+    rerank_features = build_rerank_features(review_df)   # 重排特征和全局统计信息只需建立一次
 
     for method in methods:
         print(f"\nEvaluating method: {method.upper()}")
         for query in sample_queries:
             relevant = relevance_judgments[query]
-            prec, rec, f1 = evaluate_query(query, relevant, unigram_index, bigram_index, review_df, business_df, top_k=top_k, facets=facets, method=method, process_flag=process_flag)
+            prec, rec, f1 = evaluate_query(query, relevant, unigram_index, bigram_index, review_df, business_df, top_k=top_k, facets=facets, method=method, process_flag=process_flag,
+                                           rerank_features=rerank_features)
             results[method].append({'query': query, 'precision': prec, 'recall': rec, 'f1': f1})
             print(f"run_evaluation: Query: {query}\nPrecision: {prec:.2f}, Recall: {rec:.2f}, F1: {f1:.2f}\n")
 
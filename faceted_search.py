@@ -1,4 +1,6 @@
 import ast
+from bisect import bisect_left, bisect_right
+from spatial_index import build_spatial_index, query_bbox, query_radius
 
 
 def filter_by_categories(businesses, category_list):
@@ -17,11 +19,33 @@ def filter_by_categories(businesses, category_list):
     }
 
 
-def filter_businesses(businesses, facets=None):
+def filter_by_location(spatial_index, near=None, radius=None, bbox=None):
     """
-    分面搜索入口，支持根据city、categories和min_star条件进行分面搜索
+    按地理位置筛选企业，支持半径范围和矩形范围两种条件，同时给出时取交集
+    :param spatial_index: 空间索引，见spatial_index.build_spatial_index
+    :param near: 中心点坐标(lat, lon)，需与radius同时使用
+    :param radius: 半径（公里）
+    :param bbox: 矩形范围(min_lat, min_lon, max_lat, max_lon)
+    :return: 符合地理位置条件的企业business_id集合列表
+    """
+    sets = []
+    if near is not None:
+        if radius is None or radius <= 0:
+            raise ValueError("使用near条件时必须指定大于0的radius（公里）！")
+        sets.append(set(query_radius(spatial_index, near[0], near[1], radius)))
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        sets.append(query_bbox(spatial_index, min_lat, min_lon, max_lat, max_lon))
+    return sets
+
+
+def filter_businesses(businesses, facets=None, spatial_index=None):
+    """
+    分面搜索入口，支持根据city、categories、min_star和地理位置（near+radius、bbox）条件进行分面搜索
     :param businesses: 企业数据
-    :param facets: 分面搜索条件，字典结构，{"city": xx, "categories": [yy], "stars": zz}，默认为None
+    :param facets: 分面搜索条件，字典结构，{"city": xx, "categories": [yy], "stars": zz, "near": (lat, lon), "radius": km,
+                   "bbox": (min_lat, min_lon, max_lat, max_lon)}，默认为None
+    :param spatial_index: 预先建立的空间索引，默认为None，使用地理位置条件时将临时建立
     :return: 符合搜索条件的企业business_id集合，若facets为None则返回所有企业的business_id
     """
     if facets is not None:
@@ -41,8 +65,50 @@ def filter_businesses(businesses, facets=None):
     if min_star is not None:
         sets.append({b["business_id"] for _, b in businesses.iterrows() if b["stars"] >= min_star})
 
+    near, radius, bbox = facets.get("near"), facets.get("radius"), facets.get("bbox")
+    if near is not None or bbox is not None:
+        if spatial_index is None:
+            spatial_index = build_spatial_index(businesses)
+        sets.extend(filter_by_location(spatial_index, near=near, radius=radius, bbox=bbox))
+
     # 求交集
     if sets:
         return set.intersection(*sets)
     else:
         raise ValueError("传入的facets中参数有误，查询不到对应的企业信息，请检查facets信息！")
+
+
+def filter_by_range(column, low=None, high=None):
+    """
+    在按值排序的列索引上进行范围查询（二分查找）
+    :param column: 单列索引，字典结构，{"values": 升序排列的值列表, "review_ids": 对应的review_id列表}
+    :param low: 下界（包含），默认为None，表示不限
+    :param high: 上界（包含），默认为None，表示不限
+    :return: 值在[low, high]范围内的review_id集合
+    """
+    values = column["values"]
+    lo = bisect_left(values, low) if low is not None else 0
+    hi = bisect_right(values, high) if high is not None else len(values)
+    return set(column["review_ids"][lo:hi])
+
+
+def filter_reviews(review_columns, review_facets=None):
+    """
+    评论级别的范围分面搜索入口，支持根据评论日期、评论评分和useful票数进行筛选
+    :param review_columns: 评论列索引，见index_builder.build_review_columns
+    :param review_facets: 范围条件，字典结构，{"date": (起始日期, 结束日期), "stars": (最低评分, 最高评分), "useful": (最少票数, 最多票数)}，
+                          日期为'YYYY-MM-DD'格式，上下界均包含且可以为None，默认为None
+    :return: 符合全部范围条件的review_id集合，若review_facets为None或不包含任何条件则返回None
+    """
+    if review_facets is None:
+        return None
+
+    result = None
+    for name, bounds in review_facets.items():
+        if bounds is None or all(bound is None for bound in bounds):
+            continue
+        if name not in review_columns:
+            raise ValueError(f"未知的评论分面搜索条件: {name}")
+        ids = filter_by_range(review_columns[name], *bounds)
+        result = ids if result is None else result & ids
+    return result
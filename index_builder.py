@@ -1,6 +1,12 @@
+from array import array
 from collections import defaultdict
+import ast
 import json
 import os
+import re
+import string
+import pandas as pd
+from preprocess import preprocess_tokens
 
 
 def build_unigram_index(df):
@@ -66,3 +72,120 @@ def build_indexes_and_save(review_df, save_dir='index_output', evaluator_flag=Fa
 
     return unigram_index, bigram_index
 
+
+def build_doc_business_map(review_df):
+    """
+    评论-企业映射建立函数，用于按企业聚合检索结果时避免在查询时连接DataFrame
+    :param review_df: 评论数据
+    :return: 评论所属企业，字典结构，{review_id: business_id}
+    """
+    return dict(zip(review_df['review_id'].astype(str).str.strip(), review_df['business_id']))
+
+
+def parse_useful_votes(votes):
+    """
+    从评论的votes字段中解析useful票数
+    :param votes: votes字段，原始数据中为字典，从csv文件加载时为字典的字符串形式
+    :return: useful票数，无法解析时返回0
+    """
+    if isinstance(votes, str):
+        try:
+            votes = ast.literal_eval(votes)
+        except (ValueError, SyntaxError):
+            return 0
+    if isinstance(votes, dict):
+        return int(votes.get('useful', 0) or 0)
+    return 0
+
+
+def build_review_columns(review_df):
+    """
+    评论列索引建立函数，对date、stars和useful票数分别按值排序，用于评论级别的范围分面搜索
+    :param review_df: 评论数据
+    :return: 列索引，字典结构，{column: {"values": 升序排列的值列表, "review_ids": 与values对应的review_id列表}}
+             其中date统一为'YYYY-MM-DD'格式的字符串
+    """
+    review_ids = list(review_df['review_id'].astype(str).str.strip())
+    raw_columns = {
+        "date": pd.to_datetime(review_df['date'], errors='coerce').dt.strftime('%Y-%m-%d'),
+        "stars": pd.to_numeric(review_df['stars'], errors='coerce'),
+        "useful": review_df['votes'].apply(parse_useful_votes)
+    }
+    columns = {}
+    for name, values in raw_columns.items():
+        pairs = sorted((v, rid) for v, rid in zip(values.tolist(), review_ids) if pd.notna(v))   # 缺失值不参与范围查询
+        columns[name] = {"values": [v for v, _ in pairs], "review_ids": [rid for _, rid in pairs]}
+    return columns
+
+
+def save_review_columns(review_columns, save_dir='index_output'):
+    """
+    评论列索引保存函数
+    :param review_columns: 列索引，见build_review_columns
+    :param save_dir: 保存路径，默认为./index_output
+    """
+    if save_dir is None:
+        save_dir = 'index_output'
+    os.makedirs(save_dir, exist_ok=True)
+    with open(f"{save_dir}/review_columns.json", 'w', encoding='utf-8') as f:
+        json.dump(review_columns, f, ensure_ascii=False)
+    print("评论列索引构建完成并保存。")
+
+
+def build_token_offsets(review_df, process_flag=(True, True, True, True), stop_words=None):
+    """
+    词项位置索引建立函数，记录每条评论预处理后的词项及其在原文中对应的字符区间，用于生成查询相关的摘要
+    :param review_df: 评论数据（需包含原文text字段）
+    :param process_flag: 预处理标志，需与建立单/双词索引时使用的预处理标志一致
+    :param stop_words: 停用词，需与建立单/双词索引时使用的停用词一致，默认为None
+    :return: 位置索引，字典结构，{review_id: {"tokens": 以空格连接的词项, "starts": 起始位置数组, "ends": 结束位置数组}}
+    """
+    token_offsets = {}
+    for review_id, text in zip(review_df['review_id'], review_df['text']):
+        if not isinstance(text, str):
+            continue
+        tokens, starts, ends = [], array('I'), array('I')
+        for match in re.finditer(r'\S+', text):
+            chunk_tokens = preprocess_tokens(match.group(), process_flag=process_flag, stop_words=stop_words)
+            if not chunk_tokens:
+                continue
+            # 去掉片段首尾的标点，使高亮范围只包含单词本身
+            start, end = match.span()
+            while start < end - 1 and text[start] in string.punctuation:
+                start += 1
+            while end > start + 1 and text[end - 1] in string.punctuation:
+                end -= 1
+            for token in chunk_tokens:
+                tokens.append(token)
+                starts.append(start)
+                ends.append(end)
+        token_offsets[str(review_id).strip()] = {"tokens": " ".join(tokens), "starts": starts, "ends": ends}
+    return token_offsets
+
+
+def save_token_offsets(token_offsets, save_dir='index_output'):
+    """
+    词项位置索引保存函数
+    :param token_offsets: 位置索引，见build_token_offsets
+    :param save_dir: 保存路径，默认为./index_output
+    """
+    if save_dir is None:
+        save_dir = 'index_output'
+    os.makedirs(save_dir, exist_ok=True)
+    serializable = {rid: {"tokens": d["tokens"], "starts": d["starts"].tolist(), "ends": d["ends"].tolist()}
+                    for rid, d in token_offsets.items()}
+    with open(f"{save_dir}/token_offsets.json", 'w', encoding='utf-8') as f:
+        json.dump(serializable, f, ensure_ascii=False)
+    print("词项位置索引构建完成并保存。")
+
+
+def load_token_offsets(path):
+    """
+    词项位置索引加载函数
+    :param path: token_offsets.json文件路径
+    :return: 位置索引，结构同build_token_offsets的返回值
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    return {rid: {"tokens": d["tokens"], "starts": array('I', d["starts"]), "ends": array('I', d["ends"])}
+            for rid, d in raw.items()}
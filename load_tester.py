@@ -0,0 +1,269 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import contextlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+import pandas as pd
+from query_processor import run_query
+
+_context = None   # 压测上下文（索引、数据和run_query参数），线程模式下在主进程中设置，进程模式下由_init_worker设置
+
+
+def load_query_log(path):
+    """
+    查询日志加载函数，支持两种格式：txt文件每行为一个查询字符串；jsonl文件每行为一个JSON对象，
+    如{"query": "great pizza", "facets": {"city": "Phoenix"}, "review_facets": {"stars": [4, null]}, "method": "bm25"}
+    :param path: 查询日志路径
+    :return: 查询列表，每个元素为字典，{"query": 查询字符串, "facets": 分面搜索条件, "review_facets": 评论分面搜索条件, "method": 检索方法}
+    """
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                record = json.loads(line)
+                facets = record.get("facets")
+                if facets is not None:
+                    # JSON中没有元组，坐标和范围条件转换为元组
+                    facets = {k: tuple(v) if isinstance(v, list) and k in ("near", "bbox") else v for k, v in facets.items()}
+                review_facets = record.get("review_facets")
+                if review_facets is not None:
+                    review_facets = {k: tuple(v) for k, v in review_facets.items()}
+                entries.append({"query": record["query"], "facets": facets, "review_facets": review_facets,
+                                "method": record.get("method")})
+            else:
+                entries.append({"query": line, "facets": None, "review_facets": None, "method": None})
+    return entries
+
+
+def get_rss_mb(pid=None):
+    """
+    进程常驻内存（RSS）获取函数，优先读取/proc，不可用时使用resource模块（此时为峰值RSS），两者都不可用时（如Windows）返回0
+    :param pid: 进程ID，默认为None，表示当前进程
+    :return: RSS（MB）
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource   # 仅Unix系统可用
+    except ImportError:
+        return 0.0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 / 1024 if sys.platform == 'darwin' else max_rss / 1024   # macOS下单位为字节，Linux下为KB
+
+
+def percentile(values, p):
+    """
+    百分位数计算函数（最近秩法）
+    :param values: 已排序的数值列表
+    :param p: 百分位（0-100）
+    :return: 百分位数，列表为空时返回0
+    """
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[rank - 1]
+
+
+def _init_worker(context):
+    """
+    工作进程初始化函数，将压测上下文常驻在进程中，并屏蔽run_query的输出
+    :param context: 压测上下文
+    """
+    global _context
+    _context = context
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _warm_up(_):
+    """
+    工作进程预热任务
+    :return: 进程ID
+    """
+    return os.getpid()
+
+
+def _execute_query(entry):
+    """
+    执行单条查询，作为线程/进程池的任务
+    :param entry: 查询，见load_query_log
+    :return: 执行结果，字典结构，{"service_ms": 执行耗时, "error": 错误信息, "pid": 进程ID, "rss_mb": 进程RSS, "stats": 检索统计信息}
+    """
+    context = _context
+    stats = {}
+    error = None
+    start = time.perf_counter()
+    try:
+        run_query(entry["query"], context["unigram_index"], context["bigram_index"], entry["method"] or context["method"],
+                  context["review_df"], context["business_df"], facets=entry["facets"], top_n=context["top_n"],
+                  process_flag=context["process_flag"], spatial_index=context.get("spatial_index"),
+                  review_facets=entry["review_facets"], review_columns=context.get("review_columns"),
+                  rerank_features=context.get("rerank_features"), corpus_stats=context.get("corpus_stats"), stats=stats)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    service_ms = (time.perf_counter() - start) * 1000
+    return {"service_ms": service_ms, "error": error, "pid": os.getpid(), "rss_mb": get_rss_mb(), "stats": stats}
+
+
+def run_load_test(entries, context, num_requests=None, concurrency=4, qps=None, mode='thread', rss_interval=1.0):
+    """
+    查询日志回放压测入口，按给定并发数和目标QPS回放查询，统计吞吐量、延迟分布、错误数和内存占用
+    :param entries: 查询列表，见load_query_log，请求数多于查询数时循环回放
+    :param context: 压测上下文，字典结构，包含run_query需要的unigram_index、bigram_index、review_df、business_df、method、
+                    top_n、process_flag，以及可选的spatial_index、review_columns、rerank_features、corpus_stats
+    :param num_requests: 请求总数，默认为None，表示回放一遍查询日志
+    :param concurrency: 并发数（线程数或进程数），默认为4
+    :param qps: 目标QPS，默认为None，表示闭环压测（每个请求完成后立即发送下一个请求）；指定时为开环压测，按固定间隔发送请求，
+                延迟从计划发送时间开始计算，包含排队时间
+    :param mode: 并发方式，可选值为{'thread', 'process'}，默认为'thread'
+    :param rss_interval: RSS采样间隔（秒），默认为1.0
+    :return: 压测报告，字典结构，{"summary": 汇总指标, "requests": 每个请求的结果列表, "rss": RSS采样列表}
+    """
+    global _context
+    if not entries:
+        raise ValueError("查询日志为空，请检查查询日志文件！")
+    num_requests = num_requests or len(entries)
+
+    if mode == 'thread':
+        _context = context
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+    elif mode == 'process':
+        executor = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_worker, initargs=(context,))
+    else:
+        raise ValueError(f"未知并发方式: {mode}")
+
+    requests = []
+    rss_samples = []
+    worker_rss = {}   # 各工作进程最近一次上报的RSS
+    lock = threading.Lock()
+    slots = threading.Semaphore(concurrency)
+    stop_sampling = threading.Event()
+
+    def sample_rss():
+        while not stop_sampling.is_set():
+            with lock:
+                workers_mb = sum(worker_rss.values())
+            rss_samples.append({"elapsed_s": time.perf_counter() - start, "main_rss_mb": get_rss_mb(), "workers_rss_mb": workers_mb})
+            stop_sampling.wait(rss_interval)
+
+    def on_done(future, index, scheduled):
+        finished = time.perf_counter()
+        try:
+            result = future.result()
+        except Exception as e:   # 工作进程异常退出等情况
+            result = {"service_ms": None, "error": f"{type(e).__name__}: {e}", "pid": None, "rss_mb": None, "stats": {}}
+        with lock:
+            if mode == 'process' and result["pid"] is not None:
+                worker_rss[result["pid"]] = result["rss_mb"]
+            requests.append({
+                "index": index,
+                "query": entries[index % len(entries)]["query"],
+                "latency_ms": (finished - scheduled) * 1000,
+                "service_ms": result["service_ms"],
+                "error": result["error"],
+                **{f"stats_{k}": v for k, v in result["stats"].items() if k != "query_terms"}
+            })
+        if qps is None:
+            slots.release()
+
+    if mode == 'process':
+        # 预先启动全部工作进程，避免进程启动时间计入延迟
+        list(executor.map(_warm_up, range(concurrency)))
+
+    # run_query会输出分面搜索等提示信息，压测期间屏蔽标准输出
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+        futures = []
+        for i in range(num_requests):
+            if qps is None:
+                slots.acquire()   # 闭环：等待空闲的并发槽位
+                scheduled = time.perf_counter()
+            else:
+                scheduled = start + i / qps   # 开环：按计划时间发送
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            future = executor.submit(_execute_query, entries[i % len(entries)])
+            future.add_done_callback(lambda f, i=i, scheduled=scheduled: on_done(f, i, scheduled))
+            futures.append(future)
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass   # 异常已在on_done中记录
+        elapsed = time.perf_counter() - start
+        executor.shutdown(wait=True)
+        stop_sampling.set()
+        sampler.join()
+
+    requests.sort(key=lambda r: r["index"])
+    latencies = sorted(r["latency_ms"] for r in requests if r["error"] is None)
+    errors = [r for r in requests if r["error"] is not None]
+    summary = {
+        "mode": mode,
+        "concurrency": concurrency,
+        "target_qps": qps,
+        "requests": len(requests),
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "throughput_qps": len(requests) / elapsed if elapsed > 0 else 0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else 0,
+        "peak_main_rss_mb": max((s["main_rss_mb"] for s in rss_samples), default=0),
+        "peak_workers_rss_mb": max((s["workers_rss_mb"] for s in rss_samples), default=0)
+    }
+    # 检索统计信息（如两阶段检索各阶段的耗时和候选数）取平均值
+    stat_names = sorted({k for r in requests for k in r if k.startswith("stats_")})
+    for name in stat_names:
+        values = [r[name] for r in requests if isinstance(r.get(name), (int, float)) and not isinstance(r.get(name), bool)]
+        if values:
+            summary[f"mean_{name[len('stats_'):]}"] = sum(values) / len(values)
+    return {"summary": summary, "requests": requests, "rss": rss_samples}
+
+
+def print_load_test_report(report):
+    """
+    压测报告输出函数
+    :param report: 压测报告，见run_load_test
+    """
+    summary = report["summary"]
+    print("--------压测结果---------")
+    for name, value in summary.items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
+    errors = [r["error"] for r in report["requests"] if r["error"] is not None]
+    for error in sorted(set(errors))[:5]:
+        print(f"错误示例（共{errors.count(error)}次）：{error}")
+
+
+def save_load_test_to_csv(report, save_dir='loadtest'):
+    """
+    压测结果保存函数，将汇总指标、每个请求的结果和RSS采样分别输出到csv文件，便于不同版本之间对比
+    :param report: 压测报告，见run_load_test
+    :param save_dir: 保存文件路径，默认为./loadtest
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    formatted = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime())
+    outputs = {
+        "summary": pd.DataFrame([report["summary"]]),
+        "requests": pd.DataFrame(report["requests"]),
+        "rss": pd.DataFrame(report["rss"])
+    }
+    for name, df in outputs.items():
+        file_path = os.path.join(save_dir, f'loadtest_{name}_{formatted}.csv')
+        df.to_csv(file_path, index=False)
+        print(f"结果已保存至 {file_path}")
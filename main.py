@@ -5,11 +5,20 @@ from nltk.corpus import stopwords
 from nltk.data import find
 import pandas as pd
 from preprocess import preprocess_df, calculate_dictionary_size
-from index_builder import build_indexes_and_save
-from query_processor import run_query, display_results
+from index_builder import build_indexes_and_save, build_review_columns, save_review_columns, build_doc_business_map, \
+    build_token_offsets, save_token_offsets, load_token_offsets
+from shard_index import build_sharded_indexes, load_sharded_indexes, create_shard_executor
+from spatial_index import build_spatial_index, save_spatial_index, load_spatial_index
+from dedup import deduplicate_reviews, save_cluster_map
+from cascade import build_rerank_features
+from ranker import build_corpus_stats
+from term_dictionary import build_term_dictionary, vocabulary_doc_freqs
+from query_processor import run_query, display_results, display_business_results
 from evaluator import run_evaluation, save_evaluation_to_csv
+from load_tester import load_query_log, run_load_test, print_load_test_report, save_load_test_to_csv
 import json
 import argparse
+from datetime import datetime
 
 
 def str2bool(v):
@@ -28,6 +37,52 @@ def str2bool(v):
         raise argparse.ArgumentTypeError("Boolean value expected (e.g., True/False)")
 
 
+def date_str(v):
+    """
+    日期参数校验函数，要求'YYYY-MM-DD'格式
+    :param v: 日期字符串
+    :return: 原日期字符串
+    """
+    try:
+        datetime.strptime(v, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Date in YYYY-MM-DD format expected, got '{v}'")
+    return v
+
+
+def build_facets(args):
+    """
+    分面搜索字典构建函数
+    :param args: 命令行参数
+    :return: 分面搜索条件字典，若未指定任何分面搜索参数则返回None
+    """
+    facets = {
+        "city": args.city,
+        "categories": args.categories or None,   # 只给出--categories而不指定类别时视为不筛选类别
+        "stars": args.min_star,
+        "near": tuple(args.near) if args.near is not None else None,
+        "radius": args.radius,
+        "bbox": tuple(args.bbox) if args.bbox is not None else None
+    }
+    return facets if any(v not in (None, []) for v in facets.values()) else None
+
+
+def build_review_facets(args):
+    """
+    评论级别范围分面搜索字典构建函数
+    :param args: 命令行参数
+    :return: 范围条件字典，若未指定任何评论分面搜索参数则返回None
+    """
+    review_facets = {
+        "date": (args.date_from, args.date_to),
+        "stars": (args.min_review_star, args.max_review_star),
+        "useful": (args.min_useful, None)
+    }
+    if all(bound is None for bounds in review_facets.values() for bound in bounds):
+        return None
+    return review_facets
+
+
 def download_nltk_resource(resource_id, resource_path=None):
     """
     检查NLTK资源是否存在，若不存在则下载。
@@ -59,12 +114,9 @@ def search_cmd(args):
     review_path = args.review_path
     index_path = args.index_path
     save_dir = args.save_dir
+    shard_by = args.shard_by if args.shard_by != 'none' else None
     # 分面搜索字典构建
-    facets = {
-        "city": args.city,
-        "categories": args.categories,
-        "stars": args.min_star
-    } if any([args.city, args.categories, args.min_star]) else None
+    facets = build_facets(args)
 
     # 加载数据
     business_df = pd.read_json("data/yelp_training_set/yelp_training_set_business.json", lines=True)
@@ -75,9 +127,44 @@ def search_cmd(args):
     else:
         review_df = pd.read_json("data/yelp_training_set/yelp_training_set_review.json", lines=True)  # 否则加载原始数据进行数据预处理
         processed_review_df = preprocess_df(review_df, process_flag=process_flag, stop_words=stop_words, evaluator_flag=False)
+    processed_review_df["review_id"] = processed_review_df["review_id"].astype(str).str.strip()   # 统一review_id格式，查询时不再修改
+
+    # 近似重复检测
+    cluster_map = None
+    if args.dedup != 'off':
+        if index_path and os.path.exists(index_path + "/cluster_map.json"):
+            with open(index_path + "/cluster_map.json", 'r', encoding='utf-8') as f:
+                cluster_map = json.load(f)
+            if args.dedup == 'index':
+                # 与已有索引保持一致，只保留代表评论
+                duplicate_ids = {rid for rid, canonical in cluster_map.items() if rid != canonical}
+                processed_review_df = processed_review_df[~processed_review_df['review_id'].isin(duplicate_ids)].copy()
+        else:
+            canonical_df, cluster_map, _ = deduplicate_reviews(processed_review_df, threshold=args.dedup_threshold,
+                                                               max_workers=args.workers)
+            if args.dedup == 'index':
+                processed_review_df = canonical_df   # 只对代表评论建立索引
+            # 近似重复检测开销较大，使用已有索引时将簇映射保存到索引目录，之后直接加载
+            save_cluster_map(cluster_map, index_path or save_dir)
 
     # 索引构建
-    if index_path:
+    unigram_index, bigram_index, sharded_index = None, None, None
+    if shard_by:
+        if index_path:
+            # 直接加载已有的分片索引
+            sharded_index = load_sharded_indexes(index_path + "/shards")
+            if args.dedup == 'index':
+                # 分片检索不经过评论数据过滤，已有分片中仍包含非代表评论时无法只返回代表评论
+                duplicate_ids = {rid for rid, canonical in cluster_map.items() if rid != canonical}
+                shards = sharded_index["shards"].values()
+                if any(rid in shard["doc_lengths"] for shard in shards for rid in duplicate_ids):
+                    raise ValueError("已有分片索引不是在近似重复检测后建立的，请去掉-i_pth重新建立索引，或改用--dedup collapse！")
+        else:
+            # 从预处理数据中按企业属性分片构建索引
+            processed_review_df['processed_text'] = processed_review_df['processed_text'].fillna('')
+            sharded_index = build_sharded_indexes(processed_review_df, business_df, shard_by=shard_by,
+                                                  num_shards=args.num_shards, save_dir=save_dir, max_workers=args.workers)
+    elif index_path:
         # 直接加载已有的单/双词索引
         unigram_index_path = index_path + "/unigram_index.json"
         bigram_index_path = index_path + "/bigram_index.json"
@@ -90,12 +177,90 @@ def search_cmd(args):
         processed_review_df['processed_text'] = processed_review_df['processed_text'].fillna('')
         unigram_index, bigram_index = build_indexes_and_save(processed_review_df, save_dir)
 
+    # 生成查询相关摘要需要的词项位置索引
+    token_offsets = None
+    if args.store_offsets:
+        if index_path and os.path.exists(index_path + "/token_offsets.json"):
+            token_offsets = load_token_offsets(index_path + "/token_offsets.json")
+        else:
+            token_offsets = build_token_offsets(processed_review_df, process_flag=process_flag, stop_words=stop_words)
+            if not index_path:
+                save_token_offsets(token_offsets, save_dir)
+
+    # 评论分面搜索需要的列索引
+    review_facets = build_review_facets(args)
+    review_columns = None
+    if review_facets is not None:
+        if index_path and os.path.exists(index_path + "/review_columns.json"):
+            with open(index_path + "/review_columns.json", 'r', encoding='utf-8') as f:
+                review_columns = json.load(f)
+        else:
+            review_columns = build_review_columns(processed_review_df)
+            if not index_path:
+                save_review_columns(review_columns, save_dir)
+
+    # 地理位置分面搜索需要的空间索引
+    spatial_index = None
+    if facets is not None and (facets["near"] is not None or facets["bbox"] is not None):
+        if index_path and os.path.exists(index_path + "/spatial_index.json"):
+            spatial_index = load_spatial_index(index_path + "/spatial_index.json")
+        else:
+            spatial_index = build_spatial_index(business_df)
+            if not index_path:
+                save_spatial_index(spatial_index, save_dir)
+
+    # 通配符和模糊扩展需要的有序词典
+    term_dictionary = None
+    if args.expand_terms:
+        if sharded_index is not None:
+            doc_freqs = vocabulary_doc_freqs(*(shard["unigram"] for shard in sharded_index["shards"].values()))
+        else:
+            doc_freqs = vocabulary_doc_freqs(unigram_index)
+        term_dictionary = build_term_dictionary(doc_freqs)
+
+    # 按企业聚合需要的评论-企业映射（分片索引中已包含）
+    doc_business = None
+    if args.group_by == 'business' and sharded_index is None:
+        doc_business = build_doc_business_map(processed_review_df)
+    group_params = dict(group_by=args.group_by, agg=args.agg, top_m=args.top_m, doc_business=doc_business)
+    expand_params = dict(term_dictionary=term_dictionary, max_expansions=args.max_expansions, max_edits=args.max_edits)
+    collapse_map = cluster_map if args.dedup == 'collapse' else None
+
+    # 两阶段检索需要的重排特征
+    rerank_features = None
+    if method == 'cascade' and sharded_index is None:
+        rerank_features = build_rerank_features(processed_review_df)
+    cascade_params = dict(rerank_features=rerank_features, cascade_config={
+        "num_candidates": args.num_candidates,
+        "stage1_budget_ms": args.stage1_budget_ms,
+        "stage2_budget_ms": args.stage2_budget_ms
+    })
+    query_stats = {}
+
     # 查询处理
     print("--------查询处理---------")
-    results = run_query(query, unigram_index, bigram_index, method, processed_review_df, business_df, facets=facets,
-                        top_n=top_k, process_flag=process_flag)
+    if sharded_index is not None and args.workers is not None and args.workers > 1:
+        # 多进程scatter-gather检索
+        with create_shard_executor(sharded_index, max_workers=args.workers) as executor:
+            results = run_query(query, unigram_index, bigram_index, method, processed_review_df, business_df, facets=facets,
+                                top_n=top_k, process_flag=process_flag, sharded_index=sharded_index, executor=executor,
+                                spatial_index=spatial_index, distance_boost=args.distance_boost,
+                                review_facets=review_facets, review_columns=review_columns, **group_params,
+                                **expand_params, cluster_map=collapse_map, **cascade_params, stats=query_stats)
+    else:
+        results = run_query(query, unigram_index, bigram_index, method, processed_review_df, business_df, facets=facets,
+                            top_n=top_k, process_flag=process_flag, sharded_index=sharded_index,
+                            spatial_index=spatial_index, distance_boost=args.distance_boost,
+                            review_facets=review_facets, review_columns=review_columns, **group_params,
+                            **expand_params, cluster_map=collapse_map, **cascade_params, stats=query_stats)
+    query_terms = query_stats.pop("query_terms", None)   # 与打分使用的词项一致，用于生成查询相关摘要
+    for name, value in query_stats.items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
     # 展示结果
-    display_results(results, processed_review_df)
+    if args.group_by == 'business':
+        display_business_results(results, processed_review_df, business_df, query_terms=query_terms, token_offsets=token_offsets)
+    else:
+        display_results(results, processed_review_df, query_terms=query_terms, token_offsets=token_offsets)
 
 
 def evaluate_cmd(args):
@@ -108,11 +273,7 @@ def evaluate_cmd(args):
     # 参数解析
     top_k = args.top_k
     # 分面搜索字典构建
-    facets = {
-        "city": args.city,
-        "categories": args.categories,
-        "stars": args.min_star
-    } if any([args.city, args.categories, args.min_star]) else None
+    facets = build_facets(args)
     if facets is not None:
         isfacets = True
     else:
@@ -145,6 +306,7 @@ def evaluate_cmd(args):
         print(f"\n当前启用的预处理选项: {flag_names[i]} = True，其余为 False")
         processed_review_df = preprocess_df(review_df, process_flag=process_flag, stop_words=stop_words,
                                                         evaluator_flag=True)
+        processed_review_df["review_id"] = processed_review_df["review_id"].astype(str).str.strip()   # 统一review_id格式，查询时不再修改
         dict_size = calculate_dictionary_size(processed_review_df['processed_text'])
         dict_size_df.at[0, col_name] = dict_size
         print(f"经过预处理后，字典大小为：{dict_size}")
@@ -169,6 +331,73 @@ def evaluate_cmd(args):
     print(f"字典大小已保存至{output_path}, 评估流程结束")
 
 
+def loadtest_cmd(args):
+    """
+    压测模式
+    :param args: 相关压测参数
+    """
+    stop_words = set(stopwords.words('english'))
+
+    # 参数解析
+    method = args.method
+    process_flag = (args.enable_stemming, args.ignore_case, args.process_numbers, args.remove_punctuation)   # 预处理标志
+    review_path = args.review_path
+    index_path = args.index_path
+    save_dir = args.save_dir
+    # 获取查询日志
+    entries = load_query_log(args.query_file)
+
+    # 加载数据
+    business_df = pd.read_json("data/yelp_training_set/yelp_training_set_business.json", lines=True)
+    business_df["categories"] = business_df["categories"].apply(lambda x: str(x) if isinstance(x, list) else "[]")
+    if review_path:
+        processed_review_df = pd.read_csv(review_path, low_memory=False, dtype={"processed_text": "string"})  # 直接加载已有预处理文件
+        processed_review_df = processed_review_df.dropna(subset=['processed_text']).copy()
+    else:
+        review_df = pd.read_json("data/yelp_training_set/yelp_training_set_review.json", lines=True)  # 否则加载原始数据进行数据预处理
+        processed_review_df = preprocess_df(review_df, process_flag=process_flag, stop_words=stop_words, evaluator_flag=False)
+    processed_review_df["review_id"] = processed_review_df["review_id"].astype(str).str.strip()   # 统一review_id格式，压测时各线程共享且只读
+
+    # 索引构建
+    if index_path:
+        # 直接加载已有的单/双词索引
+        with open(index_path + "/unigram_index.json", 'r', encoding='utf-8') as f:
+            unigram_index = json.load(f)
+        with open(index_path + "/bigram_index.json", 'r', encoding='utf-8') as f:
+            bigram_index = json.load(f)
+    else:
+        # 从预处理数据中构建单/双词索引
+        processed_review_df['processed_text'] = processed_review_df['processed_text'].fillna('')
+        unigram_index, bigram_index = build_indexes_and_save(processed_review_df, save_dir)
+
+    # 压测上下文，查询日志中用到的分面搜索和检索方法需要的附加索引只构建一次
+    context = dict(unigram_index=unigram_index, bigram_index=bigram_index, review_df=processed_review_df,
+                   business_df=business_df, method=method, top_n=args.top_k, process_flag=process_flag)
+    if any(e["facets"] and (e["facets"].get("near") is not None or e["facets"].get("bbox") is not None) for e in entries):
+        if index_path and os.path.exists(index_path + "/spatial_index.json"):
+            context["spatial_index"] = load_spatial_index(index_path + "/spatial_index.json")
+        else:
+            context["spatial_index"] = build_spatial_index(business_df)
+    if any(e["review_facets"] for e in entries):
+        if index_path and os.path.exists(index_path + "/review_columns.json"):
+            with open(index_path + "/review_columns.json", 'r', encoding='utf-8') as f:
+                context["review_columns"] = json.load(f)
+        else:
+            context["review_columns"] = build_review_columns(processed_review_df)
+    if any((e["method"] or method) == 'cascade' for e in entries):
+        context["rerank_features"] = build_rerank_features(processed_review_df)
+    context["corpus_stats"] = build_corpus_stats(processed_review_df)   # tfidf和bm25使用的全局统计信息
+
+    # 查询日志回放
+    print("--------压测模式---------")
+    print(f"查询数: {len(entries)}, 请求数: {args.num_requests or len(entries)}, 并发方式: {args.mode}, 并发数: {args.concurrency}, "
+          f"目标QPS: {args.qps if args.qps else '不限（闭环）'}")
+    report = run_load_test(entries, context, num_requests=args.num_requests, concurrency=args.concurrency, qps=args.qps,
+                           mode=args.mode, rss_interval=args.rss_interval)
+    print_load_test_report(report)
+    save_load_test_to_csv(report)
+
+
 def main():
     # 资源检查和下载
     download_nltk_resource('punkt', 'tokenizers/punkt')
@@ -180,11 +409,29 @@ def main():
     # 子命令：search
     parser_search = subparsers.add_parser('search', help="进行单条查询检索")
     parser_search.add_argument('-q', '--query', type=str, required=True, help="查询字符串")
-    parser_search.add_argument('-m', '--method', choices=['tf', 'tfidf', 'bm25'], default='bm25', help="检索方法，可选值为['tf', 'tfidf', 'bm25']， 默认为'bm25'")
+    parser_search.add_argument('-m', '--method', choices=['tf', 'tfidf', 'bm25', 'cascade'], default='bm25', help="检索方法，可选值为['tf', 'tfidf', 'bm25', 'cascade']，其中'cascade'为两阶段检索， 默认为'bm25'")
+    parser_search.add_argument('--num_candidates', type=int, default=100, help="两阶段检索中第一阶段保留的候选评论数量（少于-tk时按-tk），默认为100")
+    parser_search.add_argument('--stage1_budget_ms', type=float, default=None, help="两阶段检索中第一阶段的时间预算（毫秒），超出时跳过剩余的低idf词项，默认不限")
+    parser_search.add_argument('--stage2_budget_ms', type=float, default=None, help="两阶段检索中第二阶段的时间预算（毫秒），超出时剩余候选按第一阶段的顺序排在已重排的候选之后，默认不限")
     parser_search.add_argument('--city', type=str, default=None, help="分面搜索中的city")
     parser_search.add_argument('--categories', nargs='*', default=None, help="分面搜索中的categories")
     parser_search.add_argument('--min_star', type=float, default=None, help="分面搜索中的min_star")
-    parser_search.add_argument('-tk', '--top_k', type=int, default=10, help="返回的评论数量")
+    parser_search.add_argument('--near', type=float, nargs=2, default=None, metavar=('LAT', 'LON'), help="分面搜索中的中心点坐标（纬度 经度），需与--radius同时使用")
+    parser_search.add_argument('--radius', type=float, default=None, metavar='KM', help="分面搜索中的半径（公里）")
+    parser_search.add_argument('--bbox', type=float, nargs=4, default=None, metavar=('MIN_LAT', 'MIN_LON', 'MAX_LAT', 'MAX_LON'), help="分面搜索中的矩形范围（最小纬度 最小经度 最大纬度 最大经度）")
+    parser_search.add_argument('--date_from', type=date_str, default=None, help="评论分面搜索中的起始日期（包含），格式为YYYY-MM-DD")
+    parser_search.add_argument('--date_to', type=date_str, default=None, help="评论分面搜索中的结束日期（包含），格式为YYYY-MM-DD")
+    parser_search.add_argument('--min_review_star', type=float, default=None, help="评论分面搜索中的评论评分下限")
+    parser_search.add_argument('--max_review_star', type=float, default=None, help="评论分面搜索中的评论评分上限")
+    parser_search.add_argument('--min_useful', type=int, default=None, help="评论分面搜索中的useful票数下限")
+    parser_search.add_argument('--distance_boost', type=float, default=0.0, help="距离加权强度，距--near中心点越近的企业评论得分越高，默认为0.0（不加权）")
+    parser_search.add_argument('-tk', '--top_k', type=int, default=10, help="返回的评论数量（按企业聚合时为企业数量）")
+    parser_search.add_argument('-ex', '--expand_terms', type=str2bool, default=False, help="是否启用词项扩展，启用后支持通配符查询（如piz*）并对索引中不存在的词项进行模糊匹配，默认为False")
+    parser_search.add_argument('--max_expansions', type=int, default=10, help="词项扩展得到的词项总数上限，默认为10")
+    parser_search.add_argument('--max_edits', type=int, default=1, help="模糊匹配的最大编辑距离，为0时不进行模糊匹配，默认为1")
+    parser_search.add_argument('--group_by', choices=['review', 'business'], default='review', help="结果粒度，'business'为按企业聚合评论得分并返回企业，默认为'review'")
+    parser_search.add_argument('--agg', choices=['max', 'sum', 'mean'], default='max', help="企业聚合方式，'mean'为得分最高的top_m条评论的平均分，默认为'max'")
+    parser_search.add_argument('--top_m', type=int, default=3, help="按企业聚合时每个企业返回的代表评论数量，默认为3")
     parser_search.add_argument('-es', '--enable_stemming', type=str2bool, default=True, help="预处理标志，是否进行词干提取，默认为True")
     parser_search.add_argument('-ic', '--ignore_case', type=str2bool, default=True, help="预处理标志，是否忽略大小写，默认为True")
     parser_search.add_argument('-pn', '--process_numbers', type=str2bool, default=True, help="预处理标志，是否进行数字处理，True为将整体数字变成单个数字，False为忽略数字，默认为True")
@@ -192,6 +439,12 @@ def main():
     parser_search.add_argument('-r_pth', '--review_path', type=str, help="预处理后评论数据（csv文件）路径，使用此参数可以跳过预处理步骤")
     parser_search.add_argument('-i_pth', '--index_path', type=str, help="索引文件所在目录路径（应包含unigram_index.json和bigram_index.json），使用此参数可以跳过索引构建步骤")
     parser_search.add_argument('-s_dir', '--save_dir', type=str, help="单/双词索引的保存路径，默认为./index_output")
+    parser_search.add_argument('-so', '--store_offsets', type=str2bool, default=False, help="是否建立（或从index_path加载）词项位置索引token_offsets.json，用于生成包含查询词的摘要，默认为False")
+    parser_search.add_argument('--dedup', choices=['off', 'index', 'collapse'], default='off', help="近似重复评论处理方式，'index'为建立索引时只保留每个近似重复簇的代表评论，'collapse'为查询时每个簇只返回得分最高的评论，默认为'off'")
+    parser_search.add_argument('--dedup_threshold', type=float, default=0.8, help="近似重复判定的Jaccard相似度阈值，默认为0.8")
+    parser_search.add_argument('--shard_by', choices=['none', 'city', 'hash'], default='none', help="索引分片方式，'city'为按企业所在城市分片，'hash'为按business_id哈希分片，默认为'none'（不分片）；与-i_pth同时使用时从index_path/shards加载分片索引")
+    parser_search.add_argument('--num_shards', type=int, default=8, help="哈希分片的分片数量，仅在--shard_by为'hash'时生效，默认为8")
+    parser_search.add_argument('--workers', type=int, default=None, help="分片索引构建、scatter-gather检索和近似重复检测使用的进程数，默认为None（单进程）")
     parser_search.set_defaults(func=search_cmd)
 
     # 子命令：evaluate
@@ -201,9 +454,31 @@ def main():
     parser_eval.add_argument('--city', type=str, default=None, help="分面搜索中的city")
     parser_eval.add_argument('--categories', nargs='*', default=None, help="分面搜索中的categories")
     parser_eval.add_argument('--min_star', type=float, default=None, help="分面搜索中的min_star")
+    parser_eval.add_argument('--near', type=float, nargs=2, default=None, metavar=('LAT', 'LON'), help="分面搜索中的中心点坐标（纬度 经度），需与--radius同时使用")
+    parser_eval.add_argument('--radius', type=float, default=None, metavar='KM', help="分面搜索中的半径（公里）")
+    parser_eval.add_argument('--bbox', type=float, nargs=4, default=None, metavar=('MIN_LAT', 'MIN_LON', 'MAX_LAT', 'MAX_LON'), help="分面搜索中的矩形范围（最小纬度 最小经度 最大纬度 最大经度）")
     parser_eval.add_argument('-tk', '--top_k', type=int, default=10, help="返回的评论数量")
     parser_eval.set_defaults(func=evaluate_cmd)
 
+    # 子命令：loadtest
+    parser_load = subparsers.add_parser('loadtest', help="回放查询日志进行并发压测")
+    parser_load.add_argument('-qf', '--query_file', type=str, required=True, help="查询日志路径，txt文件每行对应一条查询语句，jsonl文件每行为包含query及可选facets、review_facets、method的JSON对象")
+    parser_load.add_argument('-m', '--method', choices=['tf', 'tfidf', 'bm25', 'cascade'], default='bm25', help="检索方法（查询日志中未指定时使用），默认为'bm25'")
+    parser_load.add_argument('-tk', '--top_k', type=int, default=10, help="返回的评论数量")
+    parser_load.add_argument('--concurrency', type=int, default=4, help="并发数（线程数或进程数），默认为4")
+    parser_load.add_argument('--qps', type=float, default=None, help="目标QPS，指定时按固定速率发送请求（开环），延迟包含排队时间；默认为None，即闭环压测")
+    parser_load.add_argument('--num_requests', type=int, default=None, help="请求总数，多于查询数时循环回放，默认为查询数")
+    parser_load.add_argument('--mode', choices=['thread', 'process'], default='thread', help="并发方式，'process'为多进程（每个进程常驻一份索引），默认为'thread'")
+    parser_load.add_argument('--rss_interval', type=float, default=1.0, help="内存（RSS）采样间隔（秒），默认为1.0")
+    parser_load.add_argument('-es', '--enable_stemming', type=str2bool, default=True, help="预处理标志，是否进行词干提取，默认为True")
+    parser_load.add_argument('-ic', '--ignore_case', type=str2bool, default=True, help="预处理标志，是否忽略大小写，默认为True")
+    parser_load.add_argument('-pn', '--process_numbers', type=str2bool, default=True, help="预处理标志，是否进行数字处理，默认为True")
+    parser_load.add_argument('-rp', '--remove_punctuation', type=str2bool, default=True, help="预处理标志，是否忽略标点，默认为True")
+    parser_load.add_argument('-r_pth', '--review_path', type=str, help="预处理后评论数据（csv文件）路径，使用此参数可以跳过预处理步骤")
+    parser_load.add_argument('-i_pth', '--index_path', type=str, help="索引文件所在目录路径（应包含unigram_index.json和bigram_index.json），使用此参数可以跳过索引构建步骤")
+    parser_load.add_argument('-s_dir', '--save_dir', type=str, help="单/双词索引的保存路径，默认为./index_output")
+    parser_load.set_defaults(func=loadtest_cmd)
+
     args = parser.parse_args()
     args.func(args)
 
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from nltk.stem import PorterStemmer
 from nltk.tokenize import word_tokenize
 import pandas as pd
@@ -36,6 +37,19 @@ def text_stemming(text, enable_stemming=True):
     return " ".join(words)
 
 
+_stemmer = PorterStemmer()
+
+
+@lru_cache(maxsize=100000)
+def cached_stem(word):
+    """
+    带缓存的词干提取函数，评论中的词大量重复，缓存可以避免重复计算
+    :param word: 单词
+    :return: 词干
+    """
+    return _stemmer.stem(word)
+
+
 def case_handling(text, ignore_case=True):
     """
     大小写处理函数
@@ -99,6 +113,29 @@ def preprocess_text(data, process_flag=(True, True, True, True), stop_words=None
     return text
 
 
+def preprocess_tokens(text, process_flag=(True, True, True, True), stop_words=None):
+    """
+    评论文本预处理函数，preprocess_df和词项位置索引（index_builder.build_token_offsets）共用此流程，保证两者得到的词项一致
+    :param text: 评论原文（或原文中的片段）
+    :param process_flag: 预处理标志，元组结构，为(enable_stemming, ignore_case, process_numbers, remove_punctuation)
+    :param stop_words: 停用词，若不为None则进行停用词过滤，默认为None
+    :return: 预处理后的词项列表
+    """
+    if not any(process_flag):
+        return text.split()   # 未启用任何预处理时直接使用原文
+    enable_stemming, ignore_case, process_numbers, remove_punctuation = process_flag
+    text = case_handling(text, ignore_case)
+    text = handle_numbers(text, process_numbers)
+    text = handle_punctuation(text, remove_punctuation)
+    words = text.split()
+    if stop_words is not None:
+        words = [w for w in words if w not in stop_words]   # 停用词过滤
+    words = word_tokenize(" ".join(words))
+    if enable_stemming:
+        words = [cached_stem(w) for w in words]
+    return words
+
+
 def preprocess_df(data, process_flag=(True, True, True, True), stop_words=None, evaluator_flag=False):
     """
     原始数据预处理函数
@@ -126,23 +163,8 @@ def preprocess_df(data, process_flag=(True, True, True, True), stop_words=None,
             print("*************")
             print(f"数据预处理方式为：\n词干提取：{enable_stemming}\n忽略大小写：{ignore_case}\n数字处理(True为将整体数字变成单个数字，False为忽略数字)：{process_numbers}\n忽略标点：{remove_punctuation}")
             print("*************")
-            review_df['processed_text'] = review_df['text']
-
-            review_df['processed_text'] = review_df['processed_text'].apply(
-                lambda row: case_handling(row, ignore_case))
-
-            review_df['processed_text'] = review_df['processed_text'].apply(
-                lambda row: handle_numbers(row, process_numbers))
-
-            review_df['processed_text'] = review_df['processed_text'].apply(
-                lambda row: handle_punctuation(row, remove_punctuation))
-
-            # 停用词过滤
-            review_df['processed_text'] = review_df['processed_text'].apply(
-                lambda row: preprocess_text(row, process_flag=(False, False, False, False), stop_words=stop_words))
-
-            review_df['processed_text'] = review_df['processed_text'].apply(
-                lambda row: text_stemming(row, enable_stemming))
+            review_df['processed_text'] = review_df['text'].apply(
+                lambda row: " ".join(preprocess_tokens(row, process_flag=process_flag, stop_words=stop_words)))
 
         else:
             review_df.rename(columns={'text': 'processed_text'}, inplace=True)
@@ -1,8 +1,16 @@
 import re
+from collections import defaultdict
 from preprocess import preprocess_text
-from ranker import score_by_term_frequency, score_by_tf_idf, score_by_bm25
+from ranker import accumulate_tf_scores, accumulate_tf_idf_scores, accumulate_bm25_scores, apply_business_boosts, rank_scores, \
+    aggregate_by_business, build_corpus_stats
 from nltk.corpus import stopwords
-from faceted_search import filter_businesses
+from faceted_search import filter_businesses, filter_reviews
+from index_builder import build_review_columns
+from shard_index import select_shards, scatter_gather_search
+from spatial_index import build_spatial_index, query_radius, distance_boosts
+from term_dictionary import expand_query_terms
+from dedup import collapse_duplicate_scores
+from cascade import build_rerank_features, run_cascade
 
 stop_words = set(stopwords.words('english'))
 
@@ -34,57 +42,312 @@ def parse_query(query_string, process_flag=(True, True, True, True)):
     return terms, processed_phrases, sliding_phrases
 
 
+def extract_wildcards(query_string, process_flag=(True, True, True, True)):
+    """
+    通配符提取函数，从查询字符串（双引号外）中提取包含'*'的词项，如'piz*'
+    :param query_string: 单个查询字符串
+    :param process_flag: 预处理标志，见parse_query，只使用其中的ignore_case
+    :return: wildcard_patterns：通配符模式列表；segments：以通配符词项为界切分的查询片段列表，
+             分别解析可避免在通配符两侧的单词之间生成原文中不相邻的滑动短语
+    """
+    ignore_case = process_flag[1]
+    wildcard = r'[^\s"]*\*[^\s"]*'
+    parts = re.split(r'("[^"]*")', query_string)   # 奇数下标为双引号内的短语
+    patterns = []
+    segments = ['']
+    for i, part in enumerate(parts):
+        if i % 2 == 1:
+            segments[-1] += part
+            continue
+        found = re.findall(wildcard, part)
+        patterns.extend(p.lower() if ignore_case else p for p in found if p.strip('*'))
+        pieces = re.split(wildcard, part)
+        segments[-1] += pieces[0]
+        segments.extend(pieces[1:])
+    return patterns, segments
+
+
+def prepare_query(query_string, process_flag=(True, True, True, True), term_dictionary=None, max_expansions=10, max_edits=1):
+    """
+    查询准备函数，解析查询字符串，并在提供词典时进行通配符和模糊扩展
+    :param query_string: 单个查询字符串
+    :param process_flag: 预处理标志，见parse_query
+    :param term_dictionary: 有序词典，默认为None，表示不进行词项扩展
+    :param max_expansions: 扩展得到的词项总数上限，默认为10
+    :param max_edits: 模糊扩展的最大编辑距离，默认为1
+    :return: terms：用于打分的词项列表；phrases：用于bigram匹配的短语列表
+    """
+    if term_dictionary is None:
+        terms, quoted_phrases, sliding_phrases = parse_query(query_string, process_flag=process_flag)
+        return terms, quoted_phrases + sliding_phrases
+
+    wildcard_patterns, segments = extract_wildcards(query_string, process_flag=process_flag)
+    terms, quoted_phrases, sliding_phrases = [], [], []
+    for segment in segments:
+        segment_terms, segment_quoted, segment_sliding = parse_query(segment, process_flag=process_flag)
+        terms.extend(segment_terms)
+        quoted_phrases.extend(segment_quoted)
+        sliding_phrases.extend(segment_sliding)
+    terms = expand_query_terms(terms, wildcard_patterns, term_dictionary, max_expansions=max_expansions, max_edits=max_edits)
+    return terms, quoted_phrases + sliding_phrases
+
+
 # 执行查询入口函数
-def run_query(query_string, unigram_index, bigram_index, method, processed_review_df, business_df, facets=None, top_n=10, process_flag=(True, True, True, True)):
+def run_query(query_string, unigram_index, bigram_index, method, processed_review_df, business_df, facets=None, top_n=10, process_flag=(True, True, True, True),
+              sharded_index=None, executor=None, spatial_index=None, distance_boost=0.0, review_facets=None, review_columns=None,
+              group_by='review', agg='max', top_m=3, doc_business=None, term_dictionary=None, max_expansions=10, max_edits=1,
+              cluster_map=None, rerank_features=None, cascade_config=None, stats=None, corpus_stats=None):
     """
     查询函数入口，进行单条查询检索
     :param query_string: 查询字符串(String类型)
     :param unigram_index: 单词索引
     :param bigram_index: 双词索引
-    :param method: 检索方法，可选值为{'tf', 'tfidf', 'bm25'}
-    :param processed_review_df: 预处理后的评论数据
+    :param method: 检索方法，可选值为{'tf', 'tfidf', 'bm25', 'cascade'}，其中'cascade'为两阶段检索（BM25生成候选后重排）
+    :param processed_review_df: 预处理后的评论数据，review_id需在加载时统一为去除首尾空白的字符串（查询过程中只读，可在多线程间共享）
     :param business_df: 企业数据
-    :param facets: 分面搜索条件，字典结构，{"city": xx, "categories": [yy], "stars": zz}，默认为None
+    :param facets: 分面搜索条件，字典结构，{"city": xx, "categories": [yy], "stars": zz, "near": (lat, lon), "radius": km,
+                   "bbox": (min_lat, min_lon, max_lat, max_lon)}，默认为None
     :param top_n: 返回的评论数量，默认为10
     :param process_flag: 预处理标志，元组结构，为(enable_stemming, ignore_case, process_numbers, remove_punctuation)
                          其中enable_stemming: 是否进行词干提取，默认为True; ignore_case: 是否忽略大小写，默认为True; process_numbers: 是否进行数字处理，True为将整体数字变成单个数字，False为忽略数字，默认为True;
                          remove_punctuation: 是否忽略标点，默认为True
-    :return:ranked_docs: 得分最高的top_n个评论的(review_id, score)列表
+    :param sharded_index: 分片索引，默认为None；不为None时忽略unigram_index和bigram_index，只在相关分片中进行scatter-gather检索
+    :param executor: 分片检索进程池，仅在使用分片索引时生效，默认为None，表示在当前进程中依次检索各分片
+    :param spatial_index: 预先建立的企业空间索引，用于地理位置分面搜索，默认为None
+    :param distance_boost: 距离加权强度，仅在facets中指定near时生效，默认为0.0，表示不加权
+    :param review_facets: 评论级别的范围分面搜索条件，字典结构，{"date": (起始日期, 结束日期), "stars": (最低评分, 最高评分), "useful": (最少票数, 最多票数)}，
+                          默认为None
+    :param review_columns: 预先建立的评论列索引，见index_builder.build_review_columns，默认为None，使用review_facets时将临时建立
+    :param group_by: 结果粒度，可选值为{'review', 'business'}，'business'为按企业聚合评论得分并返回企业，默认为'review'
+    :param agg: 企业聚合方式，可选值为{'max', 'sum', 'mean'}，仅在group_by为'business'时生效，默认为'max'
+    :param top_m: 每个企业返回的代表评论数量，'mean'聚合时也是参与平均的评论数量，默认为3
+    :param doc_business: 预先建立的评论-企业映射，见index_builder.build_doc_business_map，默认为None，需要时临时建立
+    :param term_dictionary: 有序词典，见term_dictionary.build_term_dictionary，默认为None；不为None时支持通配符查询（如'piz*'）
+                            并对词典中不存在的词项进行模糊扩展
+    :param max_expansions: 通配符和模糊扩展得到的词项总数上限，默认为10
+    :param max_edits: 模糊扩展的最大编辑距离，为0时不进行模糊扩展，默认为1
+    :param cluster_map: 近似重复簇映射，见dedup.find_duplicate_clusters，默认为None；不为None时每个簇只返回得分最高的评论
+    :param rerank_features: 预先建立的重排特征，见cascade.build_rerank_features，method为'cascade'时使用（其中包含语料统计信息，
+                            未指定corpus_stats时也用于tfidf和bm25），默认为None，需要时临时建立
+    :param cascade_config: 两阶段检索配置，见cascade.DEFAULT_CASCADE_CONFIG，默认为None，表示使用默认配置
+    :param stats: 用于接收检索统计信息（如两阶段检索各阶段的耗时）的字典，默认为None；其中"query_terms"为实际参与打分的
+                  词项列表（包含扩展得到的词项），可直接用于生成查询相关摘要
+    :param corpus_stats: 预先建立的语料统计信息，见ranker.build_corpus_stats，默认为None，需要时临时建立；
+                         分面搜索只决定参与打分的评论，tfidf和bm25的评论总数、平均长度和文档频率始终按全部评论计算
+    :return:ranked_docs: 得分最高的top_n个评论的(review_id, score)列表；group_by为'business'时为得分最高的top_n个企业的
+             (business_id, score, [(review_id, score)])列表
     """
+    if group_by not in ('review', 'business'):
+        raise ValueError(f"未知结果粒度: {group_by}")
+
+    # 评论级别的范围分面搜索，在列索引上二分查找得到review_id集合
+    review_ids = None
+    if review_facets is not None:
+        if review_columns is None:
+            review_columns = build_review_columns(processed_review_df)
+        review_ids = filter_reviews(review_columns, review_facets)
+        if review_ids is not None and not review_ids:
+            raise ValueError("评论分面搜索结果为空，程序终止，请尝试其他分面搜索条件！")
+
+    # 解析查询字符串
+    terms, phrases = prepare_query(query_string, process_flag=process_flag, term_dictionary=term_dictionary,
+                                   max_expansions=max_expansions, max_edits=max_edits)
+    if stats is not None:
+        stats["query_terms"] = terms
+
+    if sharded_index is not None:
+        if method == "cascade":
+            raise ValueError("分片检索暂不支持cascade方法，请使用tf、tfidf或bm25！")
+        return run_sharded_query(terms, phrases, method, sharded_index, business_df, facets=facets, top_n=top_n,
+                                 executor=executor, spatial_index=spatial_index,
+                                 distance_boost=distance_boost, review_ids=review_ids,
+                                 group_by={"agg": agg, "top_m": top_m} if group_by == 'business' else None,
+                                 cluster_map=cluster_map)
+
     # 分面搜索
-    filtered_business_ids = filter_businesses(business_df, facets)
+    filtered_business_ids = filter_businesses(business_df, facets, spatial_index=spatial_index)
     if not filtered_business_ids:
         raise ValueError("分面搜索结果为空，程序终止，请尝试其他分面搜索条件！")
     # 在筛选出的business_id下检索评论
-    processed_review_df["review_id"] = processed_review_df["review_id"].astype(str).str.strip()
     filtered_review_df = processed_review_df[processed_review_df["business_id"].isin(filtered_business_ids)]
+    if review_ids is not None:
+        filtered_review_df = filtered_review_df[filtered_review_df["review_id"].isin(review_ids)]   # 与企业分面搜索结果求交集
     filtered_review_ids = set(filtered_review_df["review_id"])
 
-    # 解析查询字符串
-    terms, quoted_phrases, sliding_phrases = parse_query(query_string, process_flag=process_flag)
-    phrases = quoted_phrases + sliding_phrases
-    # 进行查询
+    # 进行查询，分面搜索结果只作为有效评论集合，idf和长度归一化使用全局统计信息
+    if method in ("tfidf", "bm25"):
+        if corpus_stats is None:
+            corpus_stats = rerank_features if rerank_features is not None else build_corpus_stats(processed_review_df)
+        doc_freqs = {term: len(unigram_index[term]) for term in terms if term in unigram_index}
     if method == "tf":
-        ranked_docs = score_by_term_frequency(terms, phrases, unigram_index, bigram_index)
-        ranked_docs = [(rid, score) for rid, score in ranked_docs if rid in filtered_review_ids]   # 只选用符合分面搜索条件的评论
+        doc_scores = accumulate_tf_scores(terms, phrases, unigram_index, bigram_index, valid_ids=filtered_review_ids)
     elif method == "tfidf":
-        ranked_docs = score_by_tf_idf(terms, unigram_index, filtered_review_df)
+        doc_scores = accumulate_tf_idf_scores(terms, unigram_index, corpus_stats["doc_count"], doc_freqs,
+                                              valid_ids=filtered_review_ids)
     elif method == "bm25":
-        ranked_docs = score_by_bm25(terms, unigram_index, filtered_review_df)
+        doc_scores = accumulate_bm25_scores(terms, unigram_index, corpus_stats["doc_lengths"], corpus_stats["doc_count"],
+                                            corpus_stats["avgdl"], doc_freqs, valid_ids=filtered_review_ids)
+    elif method == "cascade":
+        if rerank_features is None:
+            rerank_features = build_rerank_features(processed_review_df)
+        doc_scores, cascade_stats = run_cascade(terms, phrases, unigram_index, bigram_index, rerank_features,
+                                                valid_ids=filtered_review_ids, config=cascade_config, top_n=top_n)
+        if stats is not None:
+            stats.update(cascade_stats)
     else:
         raise ValueError(f"未知方法: {method}")
-    return ranked_docs[:top_n]
+
+    # 近似重复折叠
+    if cluster_map:
+        doc_scores = collapse_duplicate_scores(doc_scores, cluster_map)
+
+    business_boosts = compute_location_boosts(business_df, facets, spatial_index=spatial_index, distance_boost=distance_boost)
+    if (business_boosts or group_by == 'business') and doc_business is None:
+        doc_business = dict(zip(filtered_review_df["review_id"], filtered_review_df["business_id"]))
+    # 按距离加权
+    if business_boosts:
+        doc_scores = apply_business_boosts(doc_scores, doc_business, business_boosts)
+    # 按企业聚合，直接在评论得分上聚合，无需对全部评论排序
+    if group_by == 'business':
+        return aggregate_by_business(doc_scores, doc_business, top_k=top_n, agg=agg, top_m=top_m)
+    return rank_scores(doc_scores, top_n=top_n)
+
+
+def compute_location_boosts(business_df, facets, spatial_index=None, distance_boost=0.0):
+    """
+    距离加权系数计算函数
+    :param business_df: 企业数据
+    :param facets: 分面搜索条件，见run_query
+    :param spatial_index: 预先建立的企业空间索引，默认为None，需要时临时建立
+    :param distance_boost: 距离加权强度，默认为0.0，表示不加权
+    :return: 企业加权系数，字典结构，{business_id: 系数}；未启用距离加权时返回None
+    """
+    if not distance_boost or facets is None or facets.get("near") is None or not facets.get("radius"):
+        return None
+    if spatial_index is None:
+        spatial_index = build_spatial_index(business_df)
+    lat, lon = facets["near"]
+    distances = query_radius(spatial_index, lat, lon, facets["radius"])
+    return distance_boosts(distances, facets["radius"], distance_boost)
+
+
+def run_sharded_query(terms, phrases, method, sharded_index, business_df, facets=None, top_n=10, executor=None,
+                      spatial_index=None, distance_boost=0.0, review_ids=None, group_by=None, cluster_map=None):
+    """
+    分片查询函数，只查询与分面搜索条件相关的分片，其余参数含义见run_query
+    :param terms: 解析后的单词列表
+    :param phrases: 解析后的短语列表
+    :param review_ids: 符合评论分面搜索条件的review_id集合，默认为None，表示不过滤
+    :param group_by: 企业聚合参数，字典结构，{"agg": 聚合方式, "top_m": 代表评论数量}，默认为None，表示不聚合
+    :param cluster_map: 近似重复簇映射，默认为None；先在各分片内折叠，合并后再跨分片折叠
+    :return: ranked_docs: 得分最高的top_n个评论的(review_id, score)列表；按企业聚合时为top_n个企业的(business_id, score, 代表评论)列表
+    """
+    shard_keys = select_shards(sharded_index, facets)
+    if not shard_keys:
+        raise ValueError("分面搜索结果为空，程序终止，请尝试其他分面搜索条件！")
+
+    # 按城市分片且只有city条件时，分片本身即为分面搜索结果，无需再按企业过滤
+    business_ids = None
+    city_only = facets is not None and all(v is None for k, v in facets.items() if k != "city")
+    if facets is not None and not (sharded_index["shard_by"] == 'city' and city_only):
+        business_ids = filter_businesses(business_df, facets, spatial_index=spatial_index)
+        if not business_ids:
+            raise ValueError("分面搜索结果为空，程序终止，请尝试其他分面搜索条件！")
+
+    business_boosts = compute_location_boosts(business_df, facets, spatial_index=spatial_index, distance_boost=distance_boost)
+    ranked_docs = scatter_gather_search(terms, phrases, method, sharded_index, shard_keys, business_ids=business_ids,
+                                        top_n=top_n, executor=executor, business_boosts=business_boosts,
+                                        review_ids=review_ids, group_by=group_by, cluster_map=cluster_map)
+    return ranked_docs
+
+
+def generate_snippet(text, doc_offsets=None, query_terms=None, window=200, highlight=('【', '】')):
+    """
+    查询相关摘要生成函数，利用建立索引时保存的词项位置，选取查询词项命中最密集的窗口并高亮命中的词
+    :param text: 评论原文
+    :param doc_offsets: 该评论的词项位置，见index_builder.build_token_offsets，默认为None
+    :param query_terms: 预处理后的查询词项，默认为None
+    :param window: 摘要长度（字符数），默认为200
+    :param highlight: 高亮标记(开始标记, 结束标记)，默认为('【', '】')
+    :return: 摘要文本；没有位置信息或没有命中时返回原文的前window个字符
+    """
+    if not doc_offsets or not query_terms:
+        return text[:window].replace('\n', ' ')
+    query_set = set(query_terms)
+    tokens, starts, ends = doc_offsets["tokens"].split(), doc_offsets["starts"], doc_offsets["ends"]
+    hits = [i for i, token in enumerate(tokens) if token in query_set]
+    if not hits:
+        return text[:window].replace('\n', ' ')
+
+    # 滑动窗口：在长度不超过window的窗口中，优先选取命中不同词项最多、其次命中次数最多的窗口
+    best, best_key = (0, 0), (0, 0)
+    counts = defaultdict(int)
+    left = 0
+    for right in range(len(hits)):
+        counts[tokens[hits[right]]] += 1
+        while left < right and ends[hits[right]] - starts[hits[left]] > window:
+            term = tokens[hits[left]]
+            counts[term] -= 1
+            if counts[term] == 0:
+                del counts[term]
+            left += 1
+        key = (len(counts), right - left + 1)
+        if key > best_key:
+            best, best_key = (left, right), key
+
+    # 以命中窗口为中心扩展到window个字符，并对齐到空白处；单个命中本身超过window时截断到window
+    span_start, span_end = starts[hits[best[0]]], ends[hits[best[1]]]
+    span_end = min(span_end, span_start + window)
+    start = max(0, span_start - (window - (span_end - span_start)) // 2)
+    end = min(len(text), max(span_end, start + window))
+    limit = max(0, start - 20)
+    while start > limit and not text[start - 1].isspace():
+        start -= 1
+
+    # 从后往前插入高亮标记，避免位置偏移
+    spans = sorted({(starts[i], min(ends[i], end)) for i in hits if start <= starts[i] < end}, reverse=True)
+    snippet = text[start:end]
+    for s, e in spans:
+        snippet = snippet[:s - start] + highlight[0] + snippet[s - start:e - start] + highlight[1] + snippet[e - start:]
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end < len(text) else ""
+    return (prefix + snippet + suffix).replace('\n', ' ')
+
+
+def display_business_results(ranked_businesses, review_df, business_df, query_terms=None, token_offsets=None):
+    """
+    按企业聚合的查询结果展示函数
+    :param ranked_businesses: 查询得到的(business_id, score, [(review_id, score)])列表
+    :param review_df: 评论数据
+    :param business_df: 企业数据
+    :param query_terms: 预处理后的查询词项，用于生成查询相关摘要，默认为None
+    :param token_offsets: 词项位置索引，见index_builder.build_token_offsets，默认为None，表示使用评论的前200个字符作为摘要
+    """
+    business_names = dict(zip(business_df['business_id'], business_df['name']))
+    business_cities = dict(zip(business_df['business_id'], business_df['city']))
+    for rank, (business_id, score, reviews) in enumerate(ranked_businesses, start=1):
+        print(f"[Rank {rank}] BusinessID: {business_id} | Name: {business_names.get(business_id)} | "
+              f"City: {business_cities.get(business_id)} | Score: {score}")
+        for doc_id, review_score in reviews:
+            text = review_df.loc[review_df['review_id'] == doc_id, 'text'].values[0]
+            snippet = generate_snippet(text, (token_offsets or {}).get(doc_id), query_terms)
+            if doc_id.endswith("?"):
+                doc_id = "#Name?"   # 还原原本的“#Name?”
+            print(f"    ReviewID: {doc_id} | Score: {review_score}\n    Snippet: {snippet}")
+        print()
 
 
-def display_results(ranked_docs, review_df):
+def display_results(ranked_docs, review_df, query_terms=None, token_offsets=None):
     """
     查询结果展示函数
     :param ranked_docs: 查询得到的(review_id, score)列表
     :param review_df: 评论数据
+    :param query_terms: 预处理后的查询词项，用于生成查询相关摘要，默认为None
+    :param token_offsets: 词项位置索引，见index_builder.build_token_offsets，默认为None，表示使用评论的前200个字符作为摘要
     """
     for rank, (doc_id, score) in enumerate(ranked_docs, start=1):
         text = review_df.loc[review_df['review_id'] == doc_id, 'text'].values[0]
-        snippet = text[:200].replace('\n', ' ')   # 选取评论的前200个字符作为摘要
+        snippet = generate_snippet(text, (token_offsets or {}).get(doc_id), query_terms)
         if doc_id.endswith("?"):
             doc_id = "#Name?"   # 还原原本的“#Name?”
         print(f"[Rank {rank}] ReviewID: {doc_id} | Score: {score}\nSnippet: {snippet}\n")
@@ -1,15 +1,61 @@
+import heapq
 import math
 from collections import defaultdict
 
 
-def score_by_term_frequency(terms, phrases, unigram_index, bigram_index):
+def rank_scores(doc_scores, top_n=None):
     """
-    tf检索方法，基于词频进行简单打分
+    得分排序函数，将(review_id -> score)字典转换为按得分从高到低排列的列表
+    :param doc_scores: 评论得分，字典结构，{review_id: score}
+    :param top_n: 只保留得分最高的top_n个评论，默认为None，表示保留全部评论
+    :return: 按得分从高到低排列的(review_id, scores)列表
+    """
+    if top_n is None:
+        return sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
+    return heapq.nlargest(top_n, doc_scores.items(), key=lambda x: x[1])   # 有界堆，避免对全部评论排序
+
+
+def apply_business_boosts(doc_scores, doc_business, business_boosts):
+    """
+    企业加权函数，将评论得分乘以其所属企业的加权系数（如按距离加权）
+    :param doc_scores: 评论得分，字典结构，{review_id: score}
+    :param doc_business: 评论所属企业，字典结构，{review_id: business_id}
+    :param business_boosts: 企业加权系数，字典结构，{business_id: 系数}，不在其中的企业系数为1
+    :return: 加权后的评论得分，字典结构，{review_id: score}
+    """
+    boosted = {}
+    for rid, score in doc_scores.items():
+        boost = business_boosts.get(doc_business.get(rid), 1.0)
+        boosted[rid] = score * boost
+    return boosted
+
+
+def build_corpus_stats(review_df):
+    """
+    语料统计信息建立函数，在全部评论上计算评论长度、评论总数和平均长度，分面搜索时仍使用这些全局统计信息打分
+    :param review_df: 预处理后的评论数据
+    :return: 统计信息，字典结构，{"doc_lengths": {review_id: token数}, "doc_count": 评论数, "avgdl": 平均长度}
+    """
+    review_ids = review_df['review_id'].astype(str).str.strip()
+    lengths = review_df['processed_text'].fillna('').str.split().str.len()
+    doc_lengths = dict(zip(review_ids, lengths.tolist()))
+    doc_count = len(doc_lengths)
+    return {
+        "doc_lengths": doc_lengths,
+        "doc_count": doc_count,
+        "avgdl": sum(doc_lengths.values()) / doc_count if doc_count > 0 else 0
+    }
+
+
+def accumulate_tf_scores(terms, phrases, unigram_index, bigram_index, valid_ids=None):
+    """
+    tf得分累加函数，返回未排序的评论得分
     :param terms: 单词列表
     :param phrases: 短语列表
     :param unigram_index: 单词索引
     :param bigram_index: 双词索引
-    :return: 按得分从高到低排列的(review_id, scores)列表
+    :param valid_ids: 有效评论ID集合，默认为None，表示不过滤
+    :return: 评论得分，字典结构，{review_id: score}
     """
     doc_scores = defaultdict(int)
 
@@ -17,52 +63,122 @@ def score_by_term_frequency(terms, phrases, unigram_index, bigram_index):
     for term in terms:
         if term in unigram_index:
             for review_id, freq in unigram_index[term].items():
+                if valid_ids is not None and review_id not in valid_ids:   # 分面搜索中过滤不相关的评论
+                    continue
                 doc_scores[review_id] += freq
 
     # 短语得分（权重更高）
     for phrase in phrases:
         if phrase in bigram_index:
             for review_id, freq in bigram_index[phrase].items():
+                if valid_ids is not None and review_id not in valid_ids:
+                    continue
                 doc_scores[review_id] += freq * 2
 
-    return sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
+    return doc_scores
 
 
-def score_by_tf_idf(terms, unigram_index, review_df):
+def accumulate_tf_idf_scores(terms, unigram_index, doc_count, doc_freqs, valid_ids=None):
     """
-    tfidf检索方法，使用TF-IDF进行打分（忽略短语，仅单词）
+    tfidf得分累加函数，使用外部传入的统计信息计算idf，返回未排序的评论得分
     :param terms: 单词列表
     :param unigram_index: 单词索引
-    :param review_df: 评论数据
-    :return: 按得分从高到低排列的(review_id, scores)列表
+    :param doc_count: 计算idf时使用的评论总数
+    :param doc_freqs: 计算idf时使用的文档频率，字典结构，{term: 包含该词的评论数}
+    :param valid_ids: 有效评论ID集合，默认为None，表示不过滤
+    :return: 评论得分，字典结构，{review_id: score}
     """
     doc_scores = defaultdict(float)
-    doc_count = len(review_df)
-
-    valid_ids = set(review_df['review_id'])  # 获取有效评论ID
 
     for term in terms:
         if term in unigram_index:
-            df = len(unigram_index[term])  # 包含该词的文档数
+            df = doc_freqs.get(term, len(unigram_index[term]))  # 包含该词的文档数
             idf = math.log((doc_count + 1) / (df + 1)) + 1  # 避免除0
             for doc_id, tf in unigram_index[term].items():
-                if doc_id not in valid_ids:  # 分面搜索中过滤不相关的评论
+                if valid_ids is not None and doc_id not in valid_ids:  # 分面搜索中过滤不相关的评论
                     continue
                 doc_scores[doc_id] += tf * idf
 
-    return sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
+    return doc_scores
 
 
-def score_by_bm25(query_terms, unigram_index, review_df, k1=1.5, b=0.75):
+def accumulate_bm25_scores(query_terms, unigram_index, doc_lengths, doc_count, avgdl, doc_freqs, valid_ids=None, k1=1.5, b=0.75):
     """
-    bm25检索方法，使用BM25算法进行打分
+    bm25得分累加函数，使用外部传入的统计信息计算idf和长度归一化，返回未排序的评论得分
     :param query_terms: 预处理后的词项列表（只使用 unigram）
     :param unigram_index: 单词索引
-    :param review_df: 评论数据
+    :param doc_lengths: 评论长度，字典结构，{review_id: token数}
+    :param doc_count: 计算idf时使用的评论总数
+    :param avgdl: 评论的平均长度
+    :param doc_freqs: 计算idf时使用的文档频率，字典结构，{term: 包含该词的评论数}
+    :param valid_ids: 有效评论ID集合，默认为None，表示不过滤
     :param k1: BM25的调节参数，默认为1.5
     :param b: BM25的调节参数，默认为0.75
+    :return: 评论得分，字典结构，{review_id: score}
+    """
+    scores = defaultdict(float)
+
+    for term in query_terms:
+        if term not in unigram_index:
+            continue
+
+        # 该 term 出现在哪些评论中（df）
+        posting = unigram_index[term]
+        df = doc_freqs.get(term, len(posting))
+
+        # IDF 计算（加1平滑）
+        idf = math.log((doc_count - df + 0.5) / (df + 0.5) + 1)
+
+        for doc_id, tf in posting.items():
+            if valid_ids is not None and doc_id not in valid_ids:   # 分面搜索中过滤不相关的评论
+                continue
+            # 计算bm25得分
+            dl = doc_lengths.get(doc_id, 0)
+            denom = tf + k1 * (1 - b + b * dl / avgdl)
+            score = idf * tf * (k1 + 1) / denom
+            scores[doc_id] += score
+
+    return scores
+
+
+def score_by_term_frequency(terms, phrases, unigram_index, bigram_index):
+    """
+    tf检索方法，基于词频进行简单打分
+    :param terms: 单词列表
+    :param phrases: 短语列表
+    :param unigram_index: 单词索引
+    :param bigram_index: 双词索引
     :return: 按得分从高到低排列的(review_id, scores)列表
     """
+    doc_scores = accumulate_tf_scores(terms, phrases, unigram_index, bigram_index)
+    return rank_scores(doc_scores)
+
+
+def tf_idf_scores(terms, unigram_index, review_df):
+    """
+    tfidf得分计算函数，使用TF-IDF进行打分（忽略短语，仅单词），返回未排序的评论得分
+    :param terms: 单词列表
+    :param unigram_index: 单词索引
+    :param review_df: 评论数据
+    :return: 评论得分，字典结构，{review_id: score}
+    """
+    doc_count = len(review_df)
+    valid_ids = set(review_df['review_id'])  # 获取有效评论ID
+    doc_freqs = {term: len(unigram_index[term]) for term in terms if term in unigram_index}
+
+    return accumulate_tf_idf_scores(terms, unigram_index, doc_count, doc_freqs, valid_ids=valid_ids)
+
+
+def bm25_scores(query_terms, unigram_index, review_df, k1=1.5, b=0.75):
+    """
+    bm25得分计算函数，使用BM25算法进行打分，返回未排序的评论得分
+    :param query_terms: 预处理后的词项列表（只使用 unigram）
+    :param unigram_index: 单词索引
+    :param review_df: 评论数据
+    :param k1: BM25的调节参数，默认为1.5
+    :param b: BM25的调节参数，默认为0.75
+    :return: 评论得分，字典结构，{review_id: score}
+    """
     N = len(review_df)
     doc_lengths = {}
     avgdl = 0   # 语料库中所有评论的平均长度
@@ -78,27 +194,73 @@ def score_by_bm25(query_terms, unigram_index, review_df, k1=1.5, b=0.75):
 
     avgdl = avgdl / N if N > 0 else 0
 
-    scores = defaultdict(float)
+    doc_freqs = {term: len(unigram_index[term]) for term in query_terms if term in unigram_index}
+    return accumulate_bm25_scores(query_terms, unigram_index, doc_lengths, N, avgdl, doc_freqs,
+                                  valid_ids=valid_ids, k1=k1, b=b)
 
-    for term in query_terms:
-        if term not in unigram_index:
-            continue
 
-        # 该 term 出现在哪些评论中（df）
-        posting = unigram_index[term]
-        df = len(posting)
+def score_by_tf_idf(terms, unigram_index, review_df):
+    """
+    tfidf检索方法，使用TF-IDF进行打分（忽略短语，仅单词）
+    :param terms: 单词列表
+    :param unigram_index: 单词索引
+    :param review_df: 评论数据
+    :return: 按得分从高到低排列的(review_id, scores)列表
+    """
+    return rank_scores(tf_idf_scores(terms, unigram_index, review_df))
 
-        # IDF 计算（加1平滑）
-        idf = math.log((N - df + 0.5) / (df + 0.5) + 1)
 
-        for doc_id, tf in posting.items():
-            if doc_id not in valid_ids:   # 分面搜索中过滤不相关的评论
-                continue
-            # 计算bm25得分
-            dl = doc_lengths.get(doc_id, 0)
-            denom = tf + k1 * (1 - b + b * dl / avgdl)
-            score = idf * tf * (k1 + 1) / denom
-            scores[doc_id] += score
+def score_by_bm25(query_terms, unigram_index, review_df, k1=1.5, b=0.75):
+    """
+    bm25检索方法，使用BM25算法进行打分
+    :param query_terms: 预处理后的词项列表（只使用 unigram）
+    :param unigram_index: 单词索引
+    :param review_df: 评论数据
+    :param k1: BM25的调节参数，默认为1.5
+    :param b: BM25的调节参数，默认为0.75
+    :return: 按得分从高到低排列的(review_id, scores)列表
+    """
+    return rank_scores(bm25_scores(query_terms, unigram_index, review_df, k1=k1, b=b))
+
+
+def aggregate_by_business(doc_scores, doc_business, top_k=10, agg='max', top_m=3):
+    """
+    企业级别结果聚合函数，在一次遍历评论得分的过程中按企业聚合，每个企业只保留得分最高的top_m条评论
+    :param doc_scores: 评论得分，字典结构，{review_id: score}
+    :param doc_business: 评论所属企业，字典结构，{review_id: business_id}
+    :param top_k: 返回的企业数量，默认为10
+    :param agg: 聚合方式，可选值为{'max', 'sum', 'mean'}，其中'mean'为得分最高的top_m条评论的平均分，默认为'max'
+    :param top_m: 每个企业保留的代表评论数量，默认为3
+    :return: 按聚合得分从高到低排列的(business_id, score, [(review_id, score)])列表，其中评论列表为该企业的代表评论
+    """
+    if agg not in ('max', 'sum', 'mean'):
+        raise ValueError(f"未知聚合方式: {agg}")
+    if top_m < 1:
+        raise ValueError("top_m必须大于等于1！")
+
+    totals = defaultdict(float)   # 企业下全部评论的得分之和
+    best = {}   # 企业下得分最高的top_m条评论，小顶堆，元素为(score, review_id)
+    for rid, score in doc_scores.items():
+        bid = doc_business.get(rid)
+        if bid is None:
+            continue
+        totals[bid] += score
+        heap = best.setdefault(bid, [])
+        if len(heap) < top_m:
+            heapq.heappush(heap, (score, rid))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, rid))
 
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    def business_score(bid):
+        if agg == 'sum':
+            return totals[bid]
+        heap = best[bid]
+        if agg == 'max':
+            return max(score for score, _ in heap)
+        return sum(score for score, _ in heap) / len(heap)
 
+    top_businesses = heapq.nlargest(top_k, ((bid, business_score(bid)) for bid in best), key=lambda x: x[1])
+    return [
+        (bid, score, [(rid, s) for s, rid in sorted(best[bid], reverse=True)])
+        for bid, score in top_businesses
+    ]
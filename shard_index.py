@@ -0,0 +1,293 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import heapq
+import itertools
+import json
+import os
+from index_builder import build_unigram_index, build_bigram_index
+from dedup import collapse_duplicate_scores
+from ranker import accumulate_tf_scores, accumulate_tf_idf_scores, accumulate_bm25_scores, apply_business_boosts, rank_scores, \
+    aggregate_by_business
+
+_worker_shards = None   # 工作进程中常驻的分片数据，由_init_worker初始化
+
+
+def hash_shard_key(business_id, num_shards):
+    """
+    按business_id哈希计算分片键（使用md5保证不同进程、不同运行之间结果一致）
+    :param business_id: 企业ID
+    :param num_shards: 分片数量
+    :return: 分片键（字符串）
+    """
+    digest = hashlib.md5(str(business_id).encode('utf-8')).hexdigest()
+    return str(int(digest, 16) % num_shards)
+
+
+def assign_shard_keys(review_df, business_df, shard_by='city', num_shards=8):
+    """
+    计算每条评论所属的分片键
+    :param review_df: 评论数据（所属企业均应在business_df中）
+    :param business_df: 企业数据
+    :param shard_by: 分片方式，可选值为{'city', 'hash'}，默认为'city'
+    :param num_shards: 分片数量，仅在shard_by为'hash'时生效，默认为8
+    :return: 与review_df行对应的分片键列表
+    """
+    if shard_by == 'city':
+        business_city = dict(zip(business_df['business_id'], business_df['city']))
+        return [business_city[bid] for bid in review_df['business_id']]
+    elif shard_by == 'hash':
+        return [hash_shard_key(bid, num_shards) for bid in review_df['business_id']]
+    else:
+        raise ValueError(f"未知分片方式: {shard_by}")
+
+
+def build_shard(shard_df):
+    """
+    单个分片建立函数，分片内包含独立的单/双词索引和统计信息
+    :param shard_df: 该分片内的评论数据
+    :return: 分片，字典结构，{"unigram": 单词索引, "bigram": 双词索引, "doc_lengths": {review_id: token数},
+             "doc_business": {review_id: business_id}, "doc_count": 评论数, "total_length": token总数}
+    """
+    doc_lengths = {rid: len(text.split()) for rid, text in zip(shard_df['review_id'], shard_df['processed_text'])}
+    return {
+        "unigram": build_unigram_index(shard_df),
+        "bigram": build_bigram_index(shard_df),
+        "doc_lengths": doc_lengths,
+        "doc_business": dict(zip(shard_df['review_id'], shard_df['business_id'])),
+        "doc_count": len(doc_lengths),
+        "total_length": sum(doc_lengths.values())
+    }
+
+
+def build_sharded_indexes(review_df, business_df, shard_by='city', num_shards=8, save_dir='index_output', evaluator_flag=False, max_workers=None):
+    """
+    分片索引建立入口，按企业属性对评论分片，每个分片单独建立索引并保存（非评估模式下）。
+    与不分片时的检索一致，找不到对应企业信息的评论不会被检索到，因此不进入任何分片，也不计入全局统计信息
+    :param review_df: 评论数据
+    :param business_df: 企业数据
+    :param shard_by: 分片方式，'city'为按企业所在城市分片，'hash'为按business_id哈希分片，默认为'city'
+    :param num_shards: 分片数量，仅在shard_by为'hash'时生效，默认为8
+    :param save_dir: 索引保存路径，分片保存在save_dir/shards下，默认为./index_output
+    :param evaluator_flag: 是否是评估模式，默认为False
+    :param max_workers: 并行建立分片的进程数，默认为None，表示串行建立
+    :return: 分片索引，字典结构，{"shard_by": 分片方式, "num_shards": 分片数量, "shards": {shard_key: 分片}}
+    """
+    matched = review_df['business_id'].isin(set(business_df['business_id']))
+    if not matched.all():
+        print(f"有{int((~matched).sum())}条评论找不到对应的企业信息，不加入分片索引。")
+        review_df = review_df[matched]
+    shard_keys = assign_shard_keys(review_df, business_df, shard_by=shard_by, num_shards=num_shards)
+    groups = [(key, group) for key, group in review_df.groupby(shard_keys, sort=True)]
+
+    if max_workers is not None and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            built = list(executor.map(build_shard, [group for _, group in groups]))
+    else:
+        built = [build_shard(group) for _, group in groups]
+    shards = {str(key): shard for (key, _), shard in zip(groups, built)}
+    sharded_index = {"shard_by": shard_by, "num_shards": len(shards), "shards": shards}
+
+    if save_dir is None:
+        save_dir = 'index_output'
+    if not evaluator_flag:
+        # 非评估模式下每个分片单独保存为JSON文件，并写入清单文件记录分片键与文件的对应关系
+        shard_dir = os.path.join(save_dir, 'shards')
+        os.makedirs(shard_dir, exist_ok=True)
+        files = {}
+        for i, (key, shard) in enumerate(shards.items()):
+            files[key] = f"shard_{i}.json"
+            with open(os.path.join(shard_dir, files[key]), 'w', encoding='utf-8') as f:
+                json.dump(shard, f, ensure_ascii=False)
+        with open(os.path.join(shard_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({"shard_by": shard_by, "num_shards": len(shards), "files": files}, f, ensure_ascii=False)
+        print(f"分片索引构建完成并保存，共{len(shards)}个分片。")
+
+    return sharded_index
+
+
+def load_sharded_indexes(shard_dir):
+    """
+    分片索引加载函数
+    :param shard_dir: 分片所在目录（应包含manifest.json）
+    :return: 分片索引，结构同build_sharded_indexes的返回值
+    """
+    with open(os.path.join(shard_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    shards = {}
+    for key, file_name in manifest["files"].items():
+        with open(os.path.join(shard_dir, file_name), 'r', encoding='utf-8') as f:
+            shards[key] = json.load(f)
+    return {"shard_by": manifest["shard_by"], "num_shards": manifest["num_shards"], "shards": shards}
+
+
+def select_shards(sharded_index, facets=None):
+    """
+    根据分面搜索条件选择需要查询的分片，按城市分片且指定了city时只查询该城市所在的分片
+    :param sharded_index: 分片索引
+    :param facets: 分面搜索条件，默认为None
+    :return: 需要查询的分片键列表
+    """
+    shards = sharded_index["shards"]
+    if sharded_index["shard_by"] == 'city' and facets is not None and facets.get("city") is not None:
+        return [facets["city"]] if facets["city"] in shards else []
+    return list(shards)
+
+
+def compute_global_stats(sharded_index, terms):
+    """
+    全局统计信息计算函数，汇总所有分片的评论数、平均长度和查询词项的文档频率，保证各分片使用一致的idf
+    :param sharded_index: 分片索引
+    :param terms: 查询词项列表
+    :return: 全局统计信息，字典结构，{"doc_count": 评论总数, "avgdl": 平均长度, "doc_freqs": {term: 文档频率}}
+    """
+    shards = sharded_index["shards"].values()
+    doc_count = sum(shard["doc_count"] for shard in shards)
+    total_length = sum(shard["total_length"] for shard in shards)
+    doc_freqs = {term: sum(len(shard["unigram"].get(term, {})) for shard in shards) for term in set(terms)}
+    return {
+        "doc_count": doc_count,
+        "avgdl": total_length / doc_count if doc_count > 0 else 0,
+        "doc_freqs": doc_freqs
+    }
+
+
+def search_shard(shard, terms, phrases, method, global_stats, business_ids=None, top_n=10, business_boosts=None, review_ids=None,
+                 group_by=None, cluster_map=None):
+    """
+    单个分片检索函数，使用全局统计信息打分，返回分片内的局部top_n结果
+    :param shard: 分片
+    :param terms: 单词列表
+    :param phrases: 短语列表
+    :param method: 检索方法，可选值为{'tf', 'tfidf', 'bm25'}
+    :param global_stats: 全局统计信息，见compute_global_stats
+    :param business_ids: 符合分面搜索条件的企业business_id集合，默认为None，表示不过滤
+    :param top_n: 返回的评论数量，默认为10
+    :param business_boosts: 企业加权系数，字典结构，{business_id: 系数}，默认为None，表示不加权
+    :param review_ids: 符合评论分面搜索条件的review_id集合，默认为None，表示不过滤
+    :param group_by: 企业聚合参数，字典结构，{"agg": 聚合方式, "top_m": 代表评论数量}，见ranker.aggregate_by_business，
+                     默认为None，表示不聚合
+    :param cluster_map: 近似重复簇映射，见dedup.find_duplicate_clusters，默认为None；不为None时在排序前折叠分片内的近似重复评论
+    :return: 分片内得分最高的top_n个评论的(review_id, score)列表；按企业聚合时为top_n个企业的(business_id, score, 代表评论)列表
+    """
+    # 先将评论分面搜索和企业分面搜索的结果求交集，只对交集内的评论打分
+    valid_ids = review_ids
+    if business_ids is not None:
+        doc_business = shard["doc_business"]
+        candidates = review_ids if review_ids is not None else doc_business
+        valid_ids = {rid for rid in candidates if doc_business.get(rid) in business_ids}
+
+    if method == "tf":
+        doc_scores = accumulate_tf_scores(terms, phrases, shard["unigram"], shard["bigram"], valid_ids=valid_ids)
+    elif method == "tfidf":
+        doc_scores = accumulate_tf_idf_scores(terms, shard["unigram"], global_stats["doc_count"], global_stats["doc_freqs"],
+                                              valid_ids=valid_ids)
+    elif method == "bm25":
+        doc_scores = accumulate_bm25_scores(terms, shard["unigram"], shard["doc_lengths"], global_stats["doc_count"],
+                                            global_stats["avgdl"], global_stats["doc_freqs"], valid_ids=valid_ids)
+    else:
+        raise ValueError(f"未知方法: {method}")
+
+    if cluster_map:
+        doc_scores = collapse_duplicate_scores(doc_scores, cluster_map)
+    if business_boosts:
+        doc_scores = apply_business_boosts(doc_scores, shard["doc_business"], business_boosts)
+    if group_by is not None:
+        # 分片按企业属性划分，同一企业的评论都在同一分片内，分片内聚合的结果即为该企业的最终结果
+        return aggregate_by_business(doc_scores, shard["doc_business"], top_k=top_n, agg=group_by["agg"], top_m=group_by["top_m"])
+    return rank_scores(doc_scores, top_n=top_n)
+
+
+def _init_worker(shards):
+    """
+    工作进程初始化函数，将分片数据常驻在进程中，避免每次查询都传输索引
+    :param shards: 分片字典，{shard_key: 分片}
+    """
+    global _worker_shards
+    _worker_shards = shards
+
+
+def _search_shard_in_worker(shard_key, terms, phrases, method, global_stats, business_ids, top_n, business_boosts, review_ids, group_by,
+                            cluster_map):
+    """
+    工作进程中的分片检索函数，参数含义见search_shard
+    """
+    return search_shard(_worker_shards[shard_key], terms, phrases, method, global_stats, business_ids=business_ids,
+                        top_n=top_n, business_boosts=business_boosts, review_ids=review_ids, group_by=group_by,
+                        cluster_map=cluster_map)
+
+
+def create_shard_executor(sharded_index, max_workers=None):
+    """
+    创建分片检索进程池，每个工作进程在启动时加载全部分片
+    :param sharded_index: 分片索引
+    :param max_workers: 进程数，默认为None，表示使用CPU核数
+    :return: ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(sharded_index["shards"],))
+
+
+def merge_collapsed(partials, cluster_map, top_n=10, group_by=None):
+    """
+    合并各分片的局部结果并再次折叠近似重复评论（同一个簇的评论可能分布在多个分片中）
+    :param partials: 各分片的局部结果列表，见search_shard
+    :param cluster_map: 近似重复簇映射
+    :param top_n: 返回的结果数量，默认为10
+    :param group_by: 企业聚合参数，见search_shard，默认为None，表示不聚合
+    :return: 折叠后得分最高的top_n个结果，结构同search_shard的返回值
+    """
+    if group_by is None:
+        return rank_scores(collapse_duplicate_scores(dict(itertools.chain.from_iterable(partials)), cluster_map), top_n=top_n)
+    # 按企业聚合时，按企业得分从高到低去掉已在更靠前的企业中出现过的簇的代表评论，没有剩余代表评论的企业不再返回
+    merged = []
+    seen = set()
+    for business_id, score, reviews in sorted(itertools.chain.from_iterable(partials), key=lambda x: x[1], reverse=True):
+        kept = [(rid, s) for rid, s in reviews if cluster_map.get(rid, rid) not in seen]
+        if not kept:
+            continue
+        seen.update(cluster_map.get(rid, rid) for rid, _ in kept)
+        merged.append((business_id, score, kept))
+        if len(merged) >= top_n:
+            break
+    return merged
+
+
+def scatter_gather_search(terms, phrases, method, sharded_index, shard_keys, business_ids=None, top_n=10, executor=None,
+                          business_boosts=None, review_ids=None, group_by=None, cluster_map=None):
+    """
+    scatter-gather检索入口，将查询分发到各分片并行检索，再合并各分片的局部top_n结果
+    :param terms: 单词列表
+    :param phrases: 短语列表
+    :param method: 检索方法，可选值为{'tf', 'tfidf', 'bm25'}
+    :param sharded_index: 分片索引
+    :param shard_keys: 需要查询的分片键列表，见select_shards
+    :param business_ids: 符合分面搜索条件的企业business_id集合，默认为None，表示不过滤
+    :param top_n: 返回的评论数量，默认为10
+    :param executor: 分片检索进程池，见create_shard_executor，默认为None，表示在当前进程中依次检索各分片
+    :param business_boosts: 企业加权系数，字典结构，{business_id: 系数}，默认为None，表示不加权
+    :param review_ids: 符合评论分面搜索条件的review_id集合，默认为None，表示不过滤
+    :param group_by: 企业聚合参数，见search_shard，默认为None，表示不聚合
+    :param cluster_map: 近似重复簇映射，见dedup.find_duplicate_clusters，默认为None；不为None时先在各分片内折叠，
+                        合并后再跨分片折叠，结果不足top_n时加倍各分片返回的数量重新检索
+    :return: 得分最高的top_n个评论的(review_id, score)列表；按企业聚合时为top_n个企业的(business_id, score, 代表评论)列表
+    """
+    global_stats = compute_global_stats(sharded_index, terms)
+
+    fetch_n = top_n
+    while True:
+        if executor is None:
+            partials = [search_shard(sharded_index["shards"][key], terms, phrases, method, global_stats,
+                                     business_ids=business_ids, top_n=fetch_n, business_boosts=business_boosts,
+                                     review_ids=review_ids, group_by=group_by, cluster_map=cluster_map) for key in shard_keys]
+        else:
+            futures = [executor.submit(_search_shard_in_worker, key, terms, phrases, method, global_stats, business_ids, fetch_n,
+                                       business_boosts, review_ids, group_by, cluster_map) for key in shard_keys]
+            partials = [future.result() for future in futures]
+
+        if not cluster_map:
+            # 各分片使用相同的全局idf，局部得分可直接比较，合并取全局top_n
+            return heapq.nlargest(top_n, itertools.chain.from_iterable(partials), key=lambda x: x[1])
+        merged = merge_collapsed(partials, cluster_map, top_n=top_n, group_by=group_by)
+        # 折叠后仍有top_n个结果，或各分片已返回全部结果时结束
+        if len(merged) >= top_n or all(len(partial) < fetch_n for partial in partials):
+            return merged
+        fetch_n *= 2
@@ -0,0 +1,161 @@
+import json
+import math
+import os
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32   # 纬度方向上每度对应的公里数
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    球面距离计算函数（haversine公式）
+    :param lat1: 第一个点的纬度
+    :param lon1: 第一个点的经度
+    :param lat2: 第二个点的纬度
+    :param lon2: 第二个点的经度
+    :return: 两点间的距离（公里）
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell_of(lat, lon, cell_deg):
+    """
+    计算坐标所在的网格单元
+    :param lat: 纬度
+    :param lon: 经度
+    :param cell_deg: 网格单元边长（度）
+    :return: 网格单元坐标(row, col)
+    """
+    return math.floor(lat / cell_deg), math.floor(lon / cell_deg)
+
+
+def build_spatial_index(business_df, cell_size_km=1.0):
+    """
+    空间索引建立函数，将企业按经纬度划分到等经纬度网格中
+    :param business_df: 企业数据（需包含latitude和longitude字段）
+    :param cell_size_km: 网格单元边长（公里，按纬度方向换算为度），默认为1.0
+    :return: 空间索引，字典结构，{"cell_deg": 网格边长（度）, "cells": {(row, col): [(business_id, lat, lon)]},
+             "coords": {business_id: (lat, lon)}}
+    """
+    cell_deg = cell_size_km / KM_PER_DEGREE
+    cells = defaultdict(list)
+    coords = {}
+    for bid, lat, lon in zip(business_df['business_id'], business_df['latitude'], business_df['longitude']):
+        if lat is None or lon is None or math.isnan(lat) or math.isnan(lon):
+            continue   # 跳过缺失坐标的企业
+        cells[_cell_of(lat, lon, cell_deg)].append((bid, lat, lon))
+        coords[bid] = (lat, lon)
+    return {"cell_deg": cell_deg, "cells": dict(cells), "coords": coords}
+
+
+def save_spatial_index(spatial_index, save_dir='index_output'):
+    """
+    空间索引保存函数，网格单元坐标保存为'row,col'形式的字符串键
+    :param spatial_index: 空间索引，见build_spatial_index
+    :param save_dir: 保存路径，默认为./index_output
+    """
+    if save_dir is None:
+        save_dir = 'index_output'
+    os.makedirs(save_dir, exist_ok=True)
+    cells = {f"{row},{col}": entries for (row, col), entries in spatial_index["cells"].items()}
+    with open(f"{save_dir}/spatial_index.json", 'w', encoding='utf-8') as f:
+        json.dump({"cell_deg": spatial_index["cell_deg"], "cells": cells}, f, ensure_ascii=False)
+    print("空间索引构建完成并保存。")
+
+
+def load_spatial_index(path):
+    """
+    空间索引加载函数
+    :param path: spatial_index.json文件路径
+    :return: 空间索引，结构同build_spatial_index的返回值
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    cells = {}
+    coords = {}
+    for key, entries in raw["cells"].items():
+        row, col = key.split(',')
+        cells[(int(row), int(col))] = [(bid, lat, lon) for bid, lat, lon in entries]
+        for bid, lat, lon in entries:
+            coords[bid] = (lat, lon)
+    return {"cell_deg": raw["cell_deg"], "cells": cells, "coords": coords}
+
+
+def _iter_cells(spatial_index, min_lat, min_lon, max_lat, max_lon):
+    """
+    遍历与经纬度矩形相交的非空网格单元
+    :param spatial_index: 空间索引
+    :param min_lat: 最小纬度
+    :param min_lon: 最小经度
+    :param max_lat: 最大纬度
+    :param max_lon: 最大经度
+    :return: 网格单元内的企业列表的生成器
+    """
+    cells = spatial_index["cells"]
+    row_lo, col_lo = _cell_of(min_lat, min_lon, spatial_index["cell_deg"])
+    row_hi, col_hi = _cell_of(max_lat, max_lon, spatial_index["cell_deg"])
+    if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(cells):
+        # 矩形覆盖的网格数多于非空网格数时，直接遍历非空网格
+        for (row, col), entries in cells.items():
+            if row_lo <= row <= row_hi and col_lo <= col <= col_hi:
+                yield entries
+        return
+    for row in range(row_lo, row_hi + 1):
+        for col in range(col_lo, col_hi + 1):
+            entries = cells.get((row, col))
+            if entries:
+                yield entries
+
+
+def query_bbox(spatial_index, min_lat, min_lon, max_lat, max_lon):
+    """
+    矩形范围查询函数
+    :param spatial_index: 空间索引
+    :param min_lat: 最小纬度
+    :param min_lon: 最小经度
+    :param max_lat: 最大纬度
+    :param max_lon: 最大经度
+    :return: 坐标在矩形范围内的企业business_id集合
+    """
+    return {
+        bid
+        for entries in _iter_cells(spatial_index, min_lat, min_lon, max_lat, max_lon)
+        for bid, lat, lon in entries
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+    }
+
+
+def query_radius(spatial_index, lat, lon, radius_km):
+    """
+    半径范围查询函数，先用半径对应的外接矩形筛选网格，再计算精确距离
+    :param spatial_index: 空间索引
+    :param lat: 中心点纬度
+    :param lon: 中心点经度
+    :param radius_km: 半径（公里）
+    :return: 半径范围内的企业及其距离，字典结构，{business_id: 距离（公里）}
+    """
+    d_lat = radius_km / KM_PER_DEGREE
+    d_lon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    result = {}
+    for entries in _iter_cells(spatial_index, lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon):
+        for bid, b_lat, b_lon in entries:
+            distance = haversine_km(lat, lon, b_lat, b_lon)
+            if distance <= radius_km:
+                result[bid] = distance
+    return result
+
+
+def distance_boosts(distances, radius_km, weight):
+    """
+    距离加权系数计算函数，距离中心点越近的企业加权系数越大
+    :param distances: 企业距离，字典结构，{business_id: 距离（公里）}，见query_radius
+    :param radius_km: 半径（公里）
+    :param weight: 加权强度，中心点处的企业得分乘以(1 + weight)，半径边缘处的企业得分不变
+    :return: 企业加权系数，字典结构，{business_id: 系数}
+    """
+    return {bid: 1 + weight * max(0.0, 1 - d / radius_km) for bid, d in distances.items()}
@@ -0,0 +1,198 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+import fnmatch
+import heapq
+import re
+
+
+def vocabulary_doc_freqs(*unigram_indexes):
+    """
+    词表文档频率统计函数，支持传入多个单词索引（如各分片的单词索引）并汇总
+    :param unigram_indexes: 单词索引
+    :return: 文档频率，字典结构，{term: 包含该词的评论数}
+    """
+    doc_freqs = defaultdict(int)
+    for unigram_index in unigram_indexes:
+        for term, postings in unigram_index.items():
+            doc_freqs[term] += len(postings)
+    return dict(doc_freqs)
+
+
+def term_ngrams(term, n=3):
+    """
+    字符n-gram生成函数，在词项首尾加上'$'作为边界，使前后缀也能参与匹配
+    :param term: 词项
+    :param n: n-gram长度，默认为3
+    :return: n-gram集合
+    """
+    padded = f"${term}$"
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+def build_term_dictionary(doc_freqs, ngram_size=3):
+    """
+    有序词典建立函数，词项按字典序存放在数组中用于二分查找前缀，并对词表建立字符n-gram索引用于模糊匹配
+    :param doc_freqs: 词表文档频率，字典结构，{term: 包含该词的评论数}，见vocabulary_doc_freqs
+    :param ngram_size: n-gram长度，默认为3
+    :return: 词典，字典结构，{"terms": 有序词项列表, "doc_freqs": 与terms对应的文档频率数组, "ngram_size": n-gram长度,
+             "ngrams": {n-gram: 包含该n-gram的词项下标数组}}
+    """
+    terms = sorted(doc_freqs)
+    ngrams = defaultdict(lambda: array('I'))
+    for term_id, term in enumerate(terms):
+        for gram in term_ngrams(term, ngram_size):
+            ngrams[gram].append(term_id)
+    return {
+        "terms": terms,
+        "doc_freqs": array('I', (doc_freqs[term] for term in terms)),
+        "ngram_size": ngram_size,
+        "ngrams": dict(ngrams)
+    }
+
+
+def contains_term(term_dictionary, term):
+    """
+    判断词项是否在词典中（二分查找）
+    :param term_dictionary: 词典
+    :param term: 词项
+    :return: 是否存在
+    """
+    terms = term_dictionary["terms"]
+    i = bisect_left(terms, term)
+    return i < len(terms) and terms[i] == term
+
+
+def prefix_range(term_dictionary, prefix):
+    """
+    前缀查找函数，通过二分查找定位以prefix开头的词项所在的下标区间
+    :param term_dictionary: 词典
+    :param prefix: 前缀
+    :return: 下标区间[lo, hi)
+    """
+    terms = term_dictionary["terms"]
+    lo = bisect_left(terms, prefix)
+    hi = bisect_left(terms, prefix + '\U0010ffff', lo)   # 以prefix开头的词项都小于prefix加上最大字符
+    return lo, hi
+
+
+def bounded_edit_distance(a, b, max_edits):
+    """
+    有界编辑距离计算函数，距离超过max_edits时提前结束
+    :param a: 字符串a
+    :param b: 字符串b
+    :param max_edits: 最大编辑距离
+    :return: 编辑距离，超过max_edits时返回max_edits + 1
+    """
+    if abs(len(a) - len(b)) > max_edits:
+        return max_edits + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, start=1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+        if min(current) > max_edits:
+            return max_edits + 1
+        previous = current
+    return min(previous[-1], max_edits + 1)
+
+
+def wildcard_lookup(term_dictionary, pattern, limit=1000):
+    """
+    通配符查找函数，用'*'前的前缀在有序词典上二分定位候选区间，再用通配符模式过滤；以'*'开头的模式改用n-gram索引生成候选。
+    在全部匹配的词项中按文档频率选取，避免按字典序截断时丢掉高频词项
+    :param term_dictionary: 词典
+    :param pattern: 通配符模式，如'piz*'
+    :param limit: 返回的词项数量上限，默认为1000
+    :return: 匹配的词项下标列表，按文档频率从高到低排列
+    """
+    prefix = pattern.split('*', 1)[0]
+    if prefix:
+        lo, hi = prefix_range(term_dictionary, prefix)
+        candidates = range(lo, hi)
+    else:
+        # 没有前缀时，使用最长的字面片段的n-gram求交集生成候选
+        n = term_dictionary["ngram_size"]
+        literal = max(pattern.split('*'), key=len)
+        if len(literal) < n:
+            return []
+        grams = {literal[i:i + n] for i in range(len(literal) - n + 1)}
+        postings = [set(term_dictionary["ngrams"].get(gram, ())) for gram in grams]
+        candidates = set.intersection(*postings)
+    terms, doc_freqs = term_dictionary["terms"], term_dictionary["doc_freqs"]
+    if pattern != prefix + '*':
+        # 只有前缀的模式（如's*'）区间内全部匹配，无需逐个检查
+        match = re.compile(fnmatch.translate(pattern)).match
+        candidates = [i for i in candidates if match(terms[i])]
+    return heapq.nlargest(limit, candidates, key=doc_freqs.__getitem__)
+
+
+def fuzzy_lookup(term_dictionary, term, max_edits=1):
+    """
+    模糊查找函数，先用n-gram计数过滤生成候选，再计算编辑距离进行验证。
+    n-gram过滤只召回与查询词至少共享一个n-gram的词项，因此对很短的词项可能漏掉部分候选
+    :param term_dictionary: 词典
+    :param term: 查询词项
+    :param max_edits: 最大编辑距离，默认为1
+    :return: 编辑距离不超过max_edits的词项下标列表，元素为(词项下标, 编辑距离)
+    """
+    n = term_dictionary["ngram_size"]
+    grams = term_ngrams(term, n)
+    counts = Counter()
+    for gram in grams:
+        counts.update(term_dictionary["ngrams"].get(gram, ()))
+
+    # 每次编辑最多破坏n个n-gram，编辑距离不超过max_edits的词项至少共享len(grams) - max_edits * n个n-gram
+    min_shared = max(1, len(grams) - max_edits * n)
+    terms = term_dictionary["terms"]
+    matches = []
+    for term_id, shared in counts.items():
+        if shared < min_shared:
+            continue
+        distance = bounded_edit_distance(term, terms[term_id], max_edits)
+        if distance <= max_edits:
+            matches.append((term_id, distance))
+    return matches
+
+
+def expand_query_terms(terms, wildcard_patterns, term_dictionary, max_expansions=10, max_edits=1):
+    """
+    查询词项扩展函数，对通配符模式进行前缀/通配符扩展，对词典中不存在的词项进行模糊扩展
+    :param terms: 预处理后的词项列表
+    :param wildcard_patterns: 通配符模式列表，见query_processor.extract_wildcards
+    :param term_dictionary: 词典
+    :param max_expansions: 扩展得到的词项总数上限，默认为10
+    :param max_edits: 模糊扩展的最大编辑距离，为0时不进行模糊扩展，默认为1
+    :return: 扩展后的词项列表，包含原有的词项
+    """
+    vocab, doc_freqs = term_dictionary["terms"], term_dictionary["doc_freqs"]
+    expanded = []
+    seen = set(terms)   # 不同扩展来源（模糊匹配、多个通配符）可能得到相同的词项，只保留一次，避免重复计分
+    budget = max_expansions
+
+    def add(term_ids):
+        nonlocal budget
+        for term_id in term_ids:
+            if budget <= 0:
+                break
+            term = vocab[term_id]
+            if term not in seen:
+                seen.add(term)
+                expanded.append(term)
+                budget -= 1
+
+    for term in terms:
+        if contains_term(term_dictionary, term) or max_edits <= 0 or budget <= 0:
+            expanded.append(term)
+            continue
+        # 编辑距离小的优先，距离相同时文档频率高的优先
+        matches = sorted(fuzzy_lookup(term_dictionary, term, max_edits), key=lambda x: (x[1], -doc_freqs[x[0]]))
+        add(term_id for term_id, _ in matches)
+
+    for pattern in wildcard_patterns:
+        if budget <= 0:
+            break
+        # 文档频率高的优先，多取已有词项的数量，保证去重后仍能用满budget
+        add(wildcard_lookup(term_dictionary, pattern, limit=budget + len(seen)))
+
+    return expanded
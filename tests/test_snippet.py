@@ -0,0 +1,34 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_builder import build_token_offsets
+from query_processor import generate_snippet
+
+
+def test_hit_wider_than_window():
+    """
+    单个命中词项本身超过摘要长度时不应越界，摘要截断到window个字符并高亮命中部分
+    """
+    text = "call " + "5" * 250
+    review_df = pd.DataFrame({"review_id": ["r1"], "text": [text]})
+    token_offsets = build_token_offsets(review_df, stop_words=set())
+
+    snippet = generate_snippet(text, token_offsets["r1"], ["5"], window=200)
+
+    assert "【" + "5" * 200 + "】" in snippet
+
+
+def test_oversized_hit_followed_by_normal_hits():
+    """
+    超长命中之后的命中仍能被正常选中和高亮
+    """
+    text = "ok 5 then " + "5" * 250 + " and 5 end"
+    review_df = pd.DataFrame({"review_id": ["r1"], "text": [text]})
+    token_offsets = build_token_offsets(review_df, stop_words=set())
+
+    snippet = generate_snippet(text, token_offsets["r1"], ["5"], window=100)
+
+    assert snippet.startswith("ok 【5】 then 【5")